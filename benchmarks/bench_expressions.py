@@ -0,0 +1,66 @@
+"""Per-item cost of evaluating expressions, before and after precompilation
+
+    python benchmarks/bench_expressions.py [--files 50000] [--root PATH]
+
+"before" evaluates the source string with the full scope on every item, as
+Expression.eval used to. "after" uses the compiled Expression.
+"""
+import os
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movy.classes import Expression, PipeItem, Property
+from movy.utils import extension
+
+EXPRESSIONS = [
+    'basename',
+    "f'{basename} - {extension}'",
+    "'pdf' if extension == 'pdf' else 'other'",
+    "upper(basename)[:3] + str(len(path))",
+]
+
+def eval_source(content: str, item: PipeItem):
+    return eval(content, {
+        **item.data,
+        'os.path': os.path,
+        'upper': lambda x:x.upper(),
+        'basename': os.path.basename(os.path.splitext(item.filepath)[0]),
+        'filename': os.path.basename(item.filepath),
+        'extension': extension(item.filepath),
+        'folderpath': os.path.split(item.filepath)[0],
+        'property': Property(item.filepath)
+    })
+
+def make_items(files: int, root: str|None) -> list[PipeItem]:
+    if root:
+        with os.scandir(root) as entries:
+            return [PipeItem(entry.path, []) for entry in entries if entry.is_file()]
+    extensions = ['pdf', 'txt', 'md', 'png', 'zip']
+    return [PipeItem(f'/tmp/root/file_{i}.{extensions[i % len(extensions)]}', []) for i in range(files)]
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--root', default=None, help='use the files of a real folder instead of generated paths')
+    args = parser.parse_args()
+
+    items = make_items(args.files, args.root)
+
+    print(f'{len(items)} items')
+    print(f'{"expression":<45} {"before (us)":>12} {"after (us)":>11} {"speedup":>8}')
+    for content in EXPRESSIONS:
+        start = perf_counter()
+        for item in items:
+            eval_source(content, item)
+        before = (perf_counter() - start) / len(items)
+
+        expression = Expression(content)
+        start = perf_counter()
+        for item in items:
+            expression.eval(item)
+        after = (perf_counter() - start) / len(items)
+
+        print(f'{content:<45} {before*1e6:>12.2f} {after*1e6:>11.2f} {before/after:>7.1f}x')
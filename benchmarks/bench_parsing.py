@@ -0,0 +1,75 @@
+"""Times Document parsing on generated scripts with thousands of blocks
+
+    python benchmarks/bench_parsing.py [--blocks 1000 2000 4000 8000] [--commands 2000 4000 8000]
+
+The per block/command time should stay flat as the script grows.
+"""
+import os
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movy.parsing import Document
+
+BLOCK = r'''
+[[Block {name}]]
+# block number {index}
+extension: pdf,txt
+and basename: /^(?P<prefix>[a-z]+)_{index}/i {
+    strict: false
+}
+(tagged) and filecontent: /total: *(?P<total>[0-9]+)/i {
+    max_pages: 2
+    verbose: {'true' if extension == 'pdf' else 'false'}
+}
+echo -> {f'\{basename\} - \{prefix\}'}
+move -> \/tmp/movy/{prefix} {
+    makedirs: true
+    on_conflict: rename
+}
+'''
+
+def block_name(index: int) -> str:
+    # block names only accept letters
+    name = ''
+    while True:
+        index, rest = divmod(index, 26)
+        name += chr(ord('a') + rest)
+        if not index:
+            return name
+
+def generate_script(blocks: int) -> str:
+    header = '---\nroot: /tmp\nsimulate: true\n---\n'
+    return header + ''.join(BLOCK.replace('{name}', block_name(i)).replace('{index}', str(i)) for i in range(blocks))
+
+def generate_long_block(commands: int) -> str:
+    return '[[Long]]\n' + ''.join(f'extension: pdf {{\n  strict: true\n}}\necho -> {{basename}} {i}\n' for i in range(commands))
+
+def bench(script: str, repeat: int) -> float:
+    document = Document(text='[[Empty]]\nextension: txt\n')
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        document.parse(script)
+        best = min(best, perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocks', type=int, nargs='+', default=[1000, 2000, 4000, 8000])
+    parser.add_argument('--commands', type=int, nargs='+', default=[2000, 4000, 8000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"blocks":>8} {"total (s)":>10} {"per block (us)":>15}')
+    for blocks in args.blocks:
+        elapsed = bench(generate_script(blocks), args.repeat)
+        print(f'{blocks:>8} {elapsed:>10.3f} {elapsed/blocks*1e6:>15.1f}')
+
+    print(f'\n{"commands":>8} {"total (s)":>10} {"per command (us)":>17}')
+    for commands in args.commands:
+        elapsed = bench(generate_long_block(commands), args.repeat)
+        print(f'{commands:>8} {elapsed:>10.3f} {elapsed/commands*1e6:>17.1f}')
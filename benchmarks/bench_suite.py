@@ -0,0 +1,204 @@
+"""Times the engine on synthetic roots and compares the results with a baseline
+
+    python benchmarks/bench_suite.py [--files 1000 10000] [--cases name_rules move] [--output results.json] [--baseline baseline.json]
+
+Roots are generated once in --workdir (see synthetic.py) and reused. Each case is
+a script run with Block.eval in simulate mode, without the persistent caches, and
+the best of --repeat runs is kept. Parsing and expressions reuse bench_parsing.py
+and bench_expressions.py.
+
+Results are saved as json. With --baseline, cases slower than the baseline by more
+than --tolerance are listed and the exit code is 1.
+"""
+import json
+import os
+import platform
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movy.parsing import Document
+from movy.classes import SnapshotStore
+
+import bench_parsing
+import bench_expressions
+from synthetic import generate_root, template_pdf
+
+HEADER = '---\nroot: {root}\nsimulate: true\n---\n'
+
+SCRIPTS = {
+    'name_rules': r'''
+[[Names]]
+extension: pdf,txt,md
+and basename: /^(invoice|receipt)_[0-9]+$/
+and file: *_1*
+''',
+    'filecontent': r'''
+[[Content]]
+extension: txt,md
+and filecontent: /total: *(?P<total>[0-9]+)/i
+''',
+    'keywords': r'''
+[[Keywords]]
+extension: txt,md
+and keywords: customer: *alice,total: *4[0-9][0-9][0-9]
+''',
+    'pdf_template': r'''
+[[Template]]
+extension: pdf
+and pdf_template: {
+    base_file: {template}
+    score: 90
+}
+''',
+    'move': r'''
+[[Move]]
+extension: txt,md,pdf
+move -> \{workdir}/moved/{extension} {
+    makedirs: true
+    on_conflict: rename
+    silent: true
+}
+''',
+}
+# each file reads or renders content, larger roots take too long to be useful
+CONTENT_LIMIT = {'filecontent': 100_000, 'keywords': 100_000, 'pdf_template': 10_000}
+
+
+class Result(NamedTuple):
+    case: str
+    files: int
+    seconds: float
+
+    @property
+    def per_item_us(self) -> float:
+        return self.seconds / max(self.files, 1) * 1e6
+
+
+def best_of(repeat: int, run: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        run()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def bench_script(case: str, root: str, workdir: str, repeat: int) -> float:
+    text = HEADER.replace('{root}', root) + SCRIPTS[case].replace('{template}', template_pdf(root)).replace('{workdir}', workdir)
+    document = Document(text=text)
+
+    def run():
+        # a new snapshot store, so the root is listed again on every run
+        snapshots = SnapshotStore()
+        for block in document.blocks:
+            block.eval(snapshots=snapshots)
+
+    cwd = os.getcwd()
+    try:
+        return best_of(repeat, run)
+    finally:
+        os.chdir(cwd)
+
+
+def bench_parsing_case(blocks: int, repeat: int) -> float:
+    return bench_parsing.bench(bench_parsing.generate_script(blocks), repeat)
+
+
+def bench_expressions_case(files: int, repeat: int) -> float:
+    items = bench_expressions.make_items(files, None)
+    expressions = [bench_expressions.Expression(content) for content in bench_expressions.EXPRESSIONS]
+
+    def run():
+        for expression in expressions:
+            for item in items:
+                expression.eval(item)
+    return best_of(repeat, run)
+
+
+def run_suite(files: list[int], cases: list[str], workdir: str, repeat: int) -> list[Result]:
+    results = []
+
+    if 'parsing' in cases:
+        # parsing does not depend on the root, the number of blocks grows instead
+        for blocks in [1000, 4000]:
+            results.append(Result('parsing', blocks, bench_parsing_case(blocks, repeat)))
+            print_result(results[-1])
+
+    for count in files:
+        if 'expressions' in cases:
+            results.append(Result('expressions', count, bench_expressions_case(count, repeat)))
+            print_result(results[-1])
+
+        script_cases = [case for case in cases if case in SCRIPTS and count <= CONTENT_LIMIT.get(case, count)]
+        if not script_cases:
+            continue
+
+        root = generate_root(os.path.join(workdir, f'root_{count}'), count)
+        for case in script_cases:
+            results.append(Result(case, count, bench_script(case, root, workdir, repeat)))
+            print_result(results[-1])
+
+    return results
+
+
+def print_result(result: Result):
+    print(f'{result.case:<14} {result.files:>9} {result.seconds:>10.3f} {result.per_item_us:>12.2f}', flush=True)
+
+
+def save(results: list[Result], path: str):
+    with open(path, 'w') as f:
+        json.dump({
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'results': [{**result._asdict(), 'per_item_us': result.per_item_us} for result in results],
+        }, f, indent=2)
+
+
+def compare(results: list[Result], baseline_path: str, tolerance: float) -> list[tuple[Result, float]]:
+    """Results slower than the same case and size of the baseline, with how many times slower"""
+    with open(baseline_path) as f:
+        baseline = {(result['case'], result['files']): result['seconds'] for result in json.load(f)['results']}
+
+    print(f'\n{"case":<14} {"files":>9} {"baseline (s)":>12} {"now (s)":>10} {"ratio":>7}')
+    regressions = []
+    for result in results:
+        before: Optional[float] = baseline.get((result.case, result.files))
+        if not before:
+            continue
+        ratio = result.seconds / before
+        mark = '  slower' if ratio > 1 + tolerance else ''
+        print(f'{result.case:<14} {result.files:>9} {before:>12.3f} {result.seconds:>10.3f} {ratio:>6.2f}x{mark}')
+        if mark:
+            regressions.append((result, ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    all_cases = ['parsing', 'expressions', *SCRIPTS]
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--cases', nargs='+', default=all_cases, choices=all_cases)
+    parser.add_argument('--workdir', default=os.path.join('/tmp', 'movy-bench'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='save the results to this json file')
+    parser.add_argument('--baseline', default=None, help='json file saved by a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before a case counts as slower')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+
+    print(f'{"case":<14} {"files":>9} {"total (s)":>10} {"per item (us)":>12}')
+    results = run_suite(args.files, args.cases, os.path.abspath(args.workdir), args.repeat)
+
+    if args.output:
+        save(results, args.output)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
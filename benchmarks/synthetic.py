@@ -0,0 +1,125 @@
+"""Generates synthetic roots for the benchmarks
+
+    python benchmarks/synthetic.py PATH [--files 10000] [--seed 0]
+
+A root has files with mixed extensions: text files with invoice-like lines, small
+pdfs copied from a few generated layouts and binary files with random bytes.
+The same parameters always generate the same root, and an existing root with the
+same parameters is reused.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+from argparse import ArgumentParser
+
+# share of each kind of file in a root
+KINDS = [
+    ('txt', 0.25),
+    ('md', 0.10),
+    ('pdf', 0.15),
+    ('png', 0.20),
+    ('jpg', 0.15),
+    ('zip', 0.10),
+    ('exe', 0.05),
+]
+TEXT_EXTENSIONS = ['txt', 'md']
+PREFIXES = ['invoice', 'receipt', 'report', 'notes', 'scan', 'photo', 'backup', 'water_bill']
+CUSTOMERS = ['alice', 'bob', 'carol', 'dave', 'erin']
+# distinct pdf layouts, pdfs of a root are copies of these
+PDF_LAYOUTS = 8
+# roots are a single folder, the suite goes from 1k to 1M files
+MAX_FILES_PER_ROOT = 1_000_000
+
+
+def text_file(rng: random.Random, index: int) -> str:
+    customer = rng.choice(CUSTOMERS)
+    lines = [
+        f'{rng.choice(PREFIXES).replace("_", " ")} number {index}',
+        f'Customer: {customer}',
+        f'total: {rng.randint(1, 5000)}',
+    ]
+    lines += [' '.join(rng.choice(PREFIXES) for _ in range(8)) for _ in range(rng.randint(0, 12))]
+    return '\n'.join(lines) + '\n'
+
+
+def pdf_layouts(folder: str) -> list[str]:
+    """A few one page pdfs with different layouts, generated with PyMuPDF"""
+    import fitz
+
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for layout in range(PDF_LAYOUTS):
+        path = os.path.join(folder, f'layout_{layout}.pdf')
+        paths.append(path)
+        if os.path.isfile(path):
+            continue
+
+        rng = random.Random(layout)
+        document = fitz.open()
+        page = document.new_page()
+        # a header bar and some boxes, placed differently in each layout
+        page.draw_rect(fitz.Rect(30, 30, 565, 90 + layout * 10), color=(0, 0, 0), fill=(0.2, 0.2, 0.2))
+        for _ in range(6):
+            x, y = rng.randint(40, 400), rng.randint(120, 700)
+            page.draw_rect(fitz.Rect(x, y, x + rng.randint(60, 150), y + rng.randint(20, 80)), color=(0, 0, 0), fill=(0.6, 0.6, 0.6))
+        page.insert_text((40, 800), f'{PREFIXES[layout]} total: {layout * 100}', fontsize=11)
+        document.save(path)
+        document.close()
+    return paths
+
+
+def generate_root(path: str, files: int, seed: int = 0) -> str:
+    """Fill `path` with `files` synthetic files, unless it was already generated with the same parameters"""
+    if files > MAX_FILES_PER_ROOT:
+        raise ValueError(f'at most {MAX_FILES_PER_ROOT} files')
+
+    parameters = {'files': files, 'seed': seed, 'version': 1}
+    marker = path.rstrip('/') + '.json'
+    try:
+        with open(marker) as f:
+            if json.load(f) == parameters and os.path.isdir(path):
+                return path
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    rng = random.Random(seed)
+    layouts = []
+    for layout in pdf_layouts(path.rstrip('/') + '.layouts'):
+        with open(layout, 'rb') as f:
+            layouts.append(f.read())
+    extensions = rng.choices([kind for kind, _ in KINDS], [share for _, share in KINDS], k=files)
+
+    for index, extension in enumerate(extensions):
+        name = f'{rng.choice(PREFIXES)}_{index}.{extension}'
+        if extension in TEXT_EXTENSIONS:
+            with open(os.path.join(path, name), 'w') as f:
+                f.write(text_file(rng, index))
+        else:
+            content = layouts[index % len(layouts)] if extension == 'pdf' else rng.randbytes(rng.randint(16, 512))
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(content)
+
+    with open(marker, 'w') as f:
+        json.dump(parameters, f)
+    return path
+
+
+def template_pdf(path: str) -> str:
+    """A layout also used by the pdfs of the root, for pdf_template"""
+    return os.path.join(path.rstrip('/') + '.layouts', 'layout_0.pdf')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate_root(args.path, args.files, args.seed)
+    print(f'{args.files} files in {args.path}', file=sys.stderr)
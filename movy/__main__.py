@@ -1,12 +1,19 @@
 import os
+import sys
 from glob import glob
 from copy import copy
 from time import sleep
+from typing import TYPE_CHECKING, Optional
 
 from argparse import RawTextHelpFormatter, ArgumentParser
 from rich import print
 
 from .parsing import Document
+from .classes import SnapshotStore
+
+if TYPE_CHECKING:
+    from .watcher import Watcher
+    from .journal import Journal
 
 def dir_path(string, asfile=False):
     if string == '': return
@@ -46,27 +53,38 @@ parser.add_argument('-s','--simulate',   action='store_true',
                     help='display only. Do not move, delete or copy files')
 parser.add_argument('--interval',    action='store', default=60,    type=int,
                     help='interval used at the daemon update (seconds)')
+parser.add_argument('--poll',   action='store_true',
+                    help='update the daemon every interval, even if file watching is available')
+parser.add_argument('--debounce',    action='store', default=2,    type=float,
+                    help='seconds without file events before the daemon runs the scripts')
+parser.add_argument('--no-cache',   action='store_true',
+                    help='do not use the compiled script, extracted content, page hash and duplicate caches, nor rule statistics')
+parser.add_argument('--cache-size',    action='store', default=64,    type=int,
+                    help='size limit of the extracted file content cache (MB)')
+parser.add_argument('-j', '--workers',    action='store', default=None,
+                    help='processes used by expensive rules (filecontent, keywords, pdf_template). A number or "auto"')
 parser.add_argument('-r', '--root',    action='store', default='./',    type=dir_path,
                     help='overwrite the folder to be used as root in all scripts')
 
 # parser.add_argument('script_path',     action='store', default=[],         type=string_parse, nargs='+',
 #                     help='path to the script (accepts more than one script at same time)')
 
-# parser.add_argument('-u','--undo',   action='store_true',
-#                     help='undo last change')
-# parser.add_argument('--history',    action='store', default=os.path.join(os.getcwd(), 'history.txt'),    type=lambda x: dir_path(x,True),
-#                     help='path to the history file')
+parser.add_argument('-u','--undo',   action='store', nargs='?', const='last', default=None,
+                    help='move back the files of the last run, or of the given run (see --history)')
+parser.add_argument('--history',   action='store_true',
+                    help='list the runs recorded in the journal')
+parser.add_argument('--stats',   action='store_true',
+                    help='show items in and out, time, exceptions and cache hits of every block and command')
+parser.add_argument('--stats-file',    action='store', default=None,
+                    help='also write the statistics to this json file (implies --stats)')
+parser.add_argument('--startup-profile',   action='store_true',
+                    help='show how long each module takes to import until the scripts are parsed')
 
 if not os.path.isdir(os.path.expanduser('~/.movy')):
     os.makedirs(os.path.expanduser('~/.movy'))
 
 args = parser.parse_args()
 
-# file_history = FileHistory()
-# with open(args.history,'r', encoding='utf-8') as f:
-#     lines = f.readlines()
-#     file_history.history_array = file_history.parse(''.join(lines))
-
 # DONE -> run blocks as time routines 
 # DONE -> build the cli
 # DONE -> fix undo history
@@ -88,7 +106,7 @@ args = parser.parse_args()
 # TODO -> add machine learning document classification
 # TODO -> add document tags output / new name for file suggestion
 # TODO -> create more ways for handling name conflicts
-# TODO -> add file duplicate detection
+# DONE -> add file duplicate detection
 # TODO -> match folders
 # TODO -> add "run external command" action
 # TODO -> write README
@@ -97,17 +115,106 @@ args = parser.parse_args()
 # TODO -> pack script into a commandline tool
 
 
-def main():
-    # if args.undo:
-    #     move_pairs(file_history.previous_items(), history=file_history) 
-    #
-    #     with open(args.history,'w', encoding='utf-8') as f:
-    #         f.write(file_history.toString().encode('cp850', 'replace').decode('cp850'))
-    #     exit()
+def run_documents(documents: list[Document], changes: Optional[dict[str, Optional[set[str]]]]=None):
+    from . import journal, stats
+
+    # all documents of a run share the listing of their roots
+    snapshots = SnapshotStore()
+    if journal.current:
+        journal.current.begin_run()
+    try:
+        for document in documents:
+            if changes is None or document.roots() & changes.keys():
+                document.run_blocks(changes, snapshots)
+    finally:
+        if journal.current:
+            journal.current.sync()
+        if stats.current:
+            stats.current.report(args.stats_file)
+            stats.current.clear()
+
+
+def show_history(file_journal: 'Journal'):
+    runs = file_journal.runs()
+    if not runs:
+        print('[yellow]the journal is empty')
+        return
+
+    for summary in runs[-20:]:
+        if summary.undoes:
+            print(f'[blue]{summary.run}[white]  undo of {summary.undoes}')
+        else:
+            status = ' [grey50](undone)' if summary.undone else ''
+            print(f'[blue]{summary.run}[white]  {summary.operations} files{status}')
+
+
+def undo(file_journal: 'Journal', run: str):
+    if run == 'last':
+        last_run = file_journal.last_run()
+        if not last_run:
+            print('[yellow]there is nothing to undo')
+            return
+        run = last_run
+    elif run not in {summary.run for summary in file_journal.runs()}:
+        print(f'[red]run "{run}" not found, see --history')
+        return
+
+    restored = file_journal.undo(run)
+    print(f'[green]restored {restored} files of {run}')
+
+
+def run_polling(documents: list[Document]):
+    print(f'Running as daemon (updating after {args.interval} seconds)')
+    try:
+        while True:
+            print('\nUpdating...')
+            run_documents(documents)
+            sleep(args.interval)
+    except:
+        print('\nexiting...')
+
+
+def run_watching(documents: list[Document], watcher: 'Watcher'):
+    print(f'Running as daemon (watching {len(watcher.watches)} folders)')
+    try:
+        run_documents(documents)
+
+        while True:
+            changes = watcher.wait(debounce=args.debounce)
+            print('\nUpdating...')
+            run_documents(documents, changes)
+    except:
+        print('\nexiting...')
+    finally:
+        watcher.close()
 
+
+def main():
     if args.root == None:
         exit()
 
+    if args.startup_profile:
+        from . import startup
+        startup.profile([arg for arg in sys.argv[1:] if arg != '--startup-profile'])
+        exit()
+
+    # modules that only some runs need are imported here, so they are not part of the startup
+    from . import journal
+    from .journal import Journal
+
+    file_journal = Journal(os.path.join(args.config, 'journal.jsonl'))
+    if args.history:
+        show_history(file_journal)
+        exit()
+    if args.undo:
+        undo(file_journal, args.undo)
+        file_journal.close()
+        exit()
+    journal.current = file_journal
+    if args.stats or args.stats_file:
+        from . import stats
+        stats.current = stats.Stats()
+
     if not args.file:
         scripts = glob(os.path.join(args.config, 'scripts')+'/*.movy')
     else:
@@ -117,7 +224,24 @@ def main():
         print(f'[red]there are no scripts in "{os.path.join(args.config, "scripts")}"')
         exit()
 
-    documents: list[Document] = [Document(script) for script in scripts]
+    script_cache = None
+    if not args.no_cache:
+        from . import cache
+        from .cache import ScriptCache, ContentStore, HashStore, DuplicateStore, RuleStats
+        script_cache = ScriptCache(os.path.join(args.config, 'cache', 'scripts'))
+        cache.content_store = ContentStore(os.path.join(args.config, 'cache', 'content.sqlite'), args.cache_size * 1024 * 1024)
+        cache.hash_store = HashStore(os.path.join(args.config, 'cache', 'hashes.sqlite'))
+        cache.duplicate_store = DuplicateStore(os.path.join(args.config, 'cache', 'duplicates.sqlite'))
+        cache.rule_stats = RuleStats(os.path.join(args.config, 'cache', 'rules.sqlite'))
+
+    documents: list[Document] = [Document(script, cache=script_cache) for script in scripts]
+
+    if script_cache:
+        print(f'[grey50]script cache: {script_cache.hits} hits, {script_cache.misses} misses')
+
+    if os.environ.get('MOVY_STARTUP_PROFILE'):
+        # started by --startup-profile, everything needed to run the scripts is imported
+        exit()
 
     found_blocks = 0
     for document in documents:
@@ -127,6 +251,8 @@ def main():
                 continue
             if args.simulate == True:
                 block.metadata['simulate'] = True
+            if args.workers:
+                block.metadata['workers'] = args.workers
             if args.root != './':
                 block.root = args.root
             found_blocks += 1
@@ -137,20 +263,27 @@ def main():
         exit()
 
     if args.daemon:
-        print(f'Running as daemon (updating after {args.interval} seconds)')
-        try:
-            while True:
-                print('\nUpdating...')
-                for document in documents:
-                    document.run_blocks()
-                sleep(args.interval)
-        except:
-            print('\nexiting...')
+        from .watcher import Watcher
+
+        watcher = None
+        if not args.poll and Watcher.is_supported():
+            roots = set().union(*(document.roots() for document in documents))
+            try:
+                watcher = Watcher(root for root in roots if os.path.isdir(root))
+            except OSError as e:
+                print(f'[yellow]file watching unavailable ({e}), falling back to polling')
+
+        if watcher:
+            run_watching(documents, watcher)
+        else:
+            run_polling(documents)
     else:
         try:
-            for document in documents:
-                document.run_blocks()
+            run_documents(documents)
         except KeyboardInterrupt:
             print('\n\n[red not bold]exiting...')
+        finally:
+            from . import parallel
+            parallel.shutdown()
 
 
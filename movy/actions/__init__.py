@@ -1,18 +1,13 @@
-from .echo import Echo
-from .move import Move
-from .trash import Trash
-from .set_defaults import Set_Defaults
-from .terminal import Terminal
-from .prompt import Prompt
+from ..registry import Registry
 
 # TODO: Build prompt action 
 
-ACTIONS = {
-    'echo': Echo,
-    'trash': Trash,
-    'move': Move,
-    'terminal': Terminal,
-    'prompt': Prompt,
-    'set_defaults': Set_Defaults
-}
-
+# action modules are imported when a script first uses them
+ACTIONS = Registry(__name__, {
+    'echo': 'echo:Echo',
+    'trash': 'trash:Trash',
+    'move': 'move:Move',
+    'terminal': 'terminal:Terminal',
+    'prompt': 'prompt:Prompt',
+    'set_defaults': 'set_defaults:Set_Defaults'
+})
@@ -5,46 +5,91 @@ from ..utils import LetterPrompt
 import os
 import shutil
 from os import path
+from typing import Iterable, Optional
+from .. import journal
+
+
+def short_path(folder: str) -> str:
+    head, tail = path.split(folder)
+    return f'{head+"/" if head else ""}[bold]{tail}'
+
+
+class Destination():
+    """
+    A destination folder of a batch, listed only once. Free names are handed out from
+    that listing, so each name pattern only keeps a counter of the next suffix to try
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.exists = path.isdir(folder)
+
+        self.names: set[str] = set(os.listdir(folder)) if self.exists else set()
+        self.device: Optional[int] = os.stat(folder).st_dev if self.exists else None
+
+        # (prefix, suffix) of a numbered name -> next number to try
+        self.counters: dict[tuple[str, str], int] = {}
+
+    def create(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self.exists = True
+        self.device = os.stat(self.folder).st_dev
+
+    def allocate(self, prefix: str, suffix: str) -> str:
+        """
+        First free name made of prefix, number and suffix, counting from 1. Every number before
+        the counter is already taken, so the folder is never searched twice for the same name
+        """
+        count = self.counters.get((prefix, suffix), 1)
+        while (name := f'{prefix}{count}{suffix}') in self.names:
+            count += 1
+        self.counters[(prefix, suffix)] = count + 1
+
+        return name
+
 
 class Move(Destination_rule):
     def __init__(self, name: str, content: list[str|Expression], arguments: list[Argument], operator: list[str], ignore_all_exceptions=False):
         super().__init__(name, content, arguments, operator, ignore_all_exceptions)
 
-    def _overwrite(self, content_path, item: PipeItem):
+    def _move_file(self, item: PipeItem, destination: Destination, name: str, pipe: Pipe, op='move'):
+        target = path.join(destination.folder, name)
         if not self.simulate:
-            shutil.move(item.filepath, path.join(content_path, path.basename(item.filepath)))
-        item.deleted = True
-
-        rprint(f'[yellow not bold]Overwrite: [green]{path.basename(item.filepath)} [blue]-> {path.split(content_path)[0]+"/" if path.split(content_path)[0] else ""}[bold]{path.split(content_path)[1]}')
+            journal.record(op, item.filepath, target, **({'overwrite': True} if name in destination.names else {}))
+            try:
+                # a rename is enough inside the same file system, shutil copies between devices
+                if item.stat().st_dev == destination.device:
+                    os.rename(item.filepath, target)
+                else:
+                    shutil.move(item.filepath, target)
+            except (OSError, shutil.Error):
+                raise ActionException(self.name, f'Unexpected Error while moving {item.filepath}')
+            pipe.moved(item, target)
 
-    def _rename(self, content_path, item: PipeItem):
-        count = 1
+        destination.names.add(name)
+        item.deleted = True
 
-        def make_name(oldpath:str):
-            nonlocal count
-            basename, extension = path.splitext(oldpath)
-            new_name = f"{basename}({count}){extension}"
-            return new_name
+    def _overwrite(self, destination: Destination, item: PipeItem, pipe: Pipe):
+        self._move_file(item, destination, path.basename(item.filepath), pipe)
 
-        if new_name := self._eval_argument('new_name', item):
-            if isinstance(new_name, Regex):
-                raise ActionException(self.name, 'cannot use Regex as argument')
-            new_name = new_name.replace('%d', str(count))
-        else:
-            new_name = make_name(path.basename(item.filepath))
+        rprint(f'[yellow not bold]Overwrite: [green]{path.basename(item.filepath)} [blue]-> {short_path(destination.folder)}')
 
+    def _rename(self, destination: Destination, item: PipeItem, pipe: Pipe):
+        new_name = self._eval_argument('new_name', item) or path.basename(item.filepath)
+        if isinstance(new_name, Regex):
+            raise ActionException(self.name, 'cannot use Regex as argument')
 
-        while path.isfile(path.join(content_path, new_name)):
-            new_name = make_name(new_name)
-            count+=1
+        if '%d' in new_name:
+            new_name = destination.allocate(*new_name.split('%d', 1))
+        elif new_name in destination.names:
+            basename, extension = path.splitext(new_name)
+            new_name = destination.allocate(f'{basename}(', f'){extension}')
 
-        if not self.simulate:
-            shutil.move(item.filepath, path.join(content_path, new_name))
-        item.deleted = True
+        self._move_file(item, destination, new_name, pipe, 'rename')
 
-        rprint(f'[yellow not bold]Rename: [green]{path.basename(item.filepath)} [blue]-> {path.split(content_path)[0]+"/" if path.split(content_path)[0] else ""}[bold]{new_name}')
+        rprint(f'[yellow not bold]Rename: [green]{path.basename(item.filepath)} [blue]-> {short_path(destination.folder)}/{new_name}')
 
-    def eval_item(self, item: PipeItem, pipe: Pipe):
+    def _destination(self, item: PipeItem) -> Optional[str]:
         content = self._eval_content(item)
 
         if isinstance(content, Regex):
@@ -52,49 +97,77 @@ class Move(Destination_rule):
         if not self.content:
             raise ActionException(self.name, 'destination path is empty')
         if not content:
-            return
-
+            return None
+        if not item.isfile:
+            raise ActionException(self.name, 'this action can only move files')
 
-        if not path.isdir(content):
-            if self._eval_argument('makedirs', item) == 'true':
-                if not self.simulate:
-                    os.makedirs(content)
-            else:
-                raise ActionException(self.name, f'directory {content} does not exist. Use the argument "makedirs" to automatically create missing directories')
+        # "move -> folder {" leaves a space after the folder
+        return path.expanduser(content.rstrip())
 
-        if path.isfile(item.filepath):
+    def _move_item(self, item: PipeItem, destination: Destination, pipe: Pipe):
+        name = path.basename(item.filepath)
 
-            if path.isfile(path.join(content, path.basename(item.filepath))):
-                rprint(f'[yellow]Move: "{item.filepath}" already exists in destination folder')
-                available_choices = ['rename', 'overwrite', 'skip']
+        if name in destination.names:
+            rprint(f'[yellow]Move: "{item.filepath}" already exists in destination folder')
+            available_choices = ['rename', 'overwrite', 'skip']
 
-                argument_choice = self._eval_argument('on_conflict', item) 
+            argument_choice = self._eval_argument('on_conflict', item)
 
-                if argument_choice in available_choices:
-                    choice = argument_choice
-                else:
-                    choice = LetterPrompt.ask('what to do?', choices=available_choices, default='skip')
-
-                if choice == 'overwrite':
-                    self._overwrite(content, item)
-                elif choice == 'rename':
-                    self._rename(content, item)
-                elif choice == 'skip':
-                    rprint(f'[yellow]ignoring "{path.basename(item.filepath)}"')
+            if argument_choice in available_choices:
+                choice = argument_choice
             else:
-                try:
-                    if not self.simulate:
-                        shutil.move(item.filepath, content)
-                    if self._eval_argument('silent', item) != 'true':
-                        rprint(f'[yellow not bold]Move: [green]{path.basename(item.filepath)} [blue]-> {path.split(content)[0]+"/" if path.split(content)[0] else ""}[bold]{path.split(content)[1]}')
-                    item.deleted = True
-                except shutil.Error:
-                    raise ActionException(self.name, f'Unexpected Error while moving {item.filepath}')
-
+                choice = LetterPrompt.ask('what to do?', choices=available_choices, default='skip')
+
+            if choice == 'overwrite':
+                self._overwrite(destination, item, pipe)
+            elif choice == 'rename':
+                self._rename(destination, item, pipe)
+            elif choice == 'skip':
+                rprint(f'[yellow]ignoring "{name}"')
+            return
 
+        self._move_file(item, destination, name, pipe)
+        if self._eval_argument('silent', item) != 'true':
+            rprint(f'[yellow not bold]Move: [green]{name} [blue]-> {short_path(destination.folder)}')
+
+    def move_all(self, items: Iterable[PipeItem], pipe: Pipe):
+        """
+        Move items grouped by destination folder. Each folder is checked, created and
+        listed once, and conflicts are found in that listing instead of one check per file
+        """
+        groups: dict[str, list[PipeItem]] = {}
+        for item in items:
+            if item.deleted:
+                continue
+            try:
+                folder = self._destination(item)
+            except ActionException as e:
+                pipe.report(e, self.ignore_all_exceptions)
+                continue
+            if folder:
+                groups.setdefault(folder, []).append(item)
+
+        for folder, group in groups.items():
+            destination = Destination(folder)
+
+            if not destination.exists:
+                if self._eval_argument('makedirs', group[0]) != 'true':
+                    pipe.report(ActionException(self.name, f'directory {folder} does not exist. Use the argument "makedirs" to automatically create missing directories'), self.ignore_all_exceptions)
+                    continue
+                if not self.simulate:
+                    destination.create()
 
-        else:
-            raise ActionException(self.name, 'this action can only move files')
+            for item in group:
+                try:
+                    self._move_item(item, destination, pipe)
+                except ActionException as e:
+                    pipe.report(e, self.ignore_all_exceptions)
 
+    def eval(self, pipe: Pipe):
+        self.move_all(list(pipe.items), pipe)
 
+    def eval_all(self, pipe: Pipe):
+        self.move_all(list(pipe.items), pipe)
 
+    def eval_item(self, item: PipeItem, pipe: Pipe):
+        self.move_all([item], pipe)
@@ -1,9 +1,16 @@
 from ..classes import Destination_rule, Pipe, Expression, Argument, PipeItem
+from ..classes.exceptions import ActionException
+from ..utils import parse_int
 import shlex
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from rich import print as rprint
 import os
 from dataclasses import dataclass
+from typing import Callable, Iterable, NamedTuple, Optional
+
+# a batch of paths uses at most this much of the command line, leaving room for the environment
+MAX_COMMAND_LENGTH = min(os.sysconf('SC_ARG_MAX') // 2, 128 * 1024) if hasattr(os, 'sysconf') else 32 * 1024
 
 @dataclass
 class TerminalData():
@@ -12,41 +19,134 @@ class TerminalData():
     def __str__(self):
         return self.out
 
+
+class Job(NamedTuple):
+    items: list[PipeItem]
+    command: str
+    args: list[str]
+    cwd: str
+
+
+class Result(NamedTuple):
+    out: str
+    error: Optional[str]
+
+
+def run_command(args: list[str], cwd: str, timeout: Optional[float]) -> Result:
+    try:
+        p = subprocess.run(args, cwd=cwd, stdout=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        out = e.stdout or b''
+        return Result(out.decode('utf-8', errors='replace'), f'timed out after {timeout}s')
+    except OSError as e:
+        return Result('', e.strerror)
+
+    out = p.stdout.decode('utf-8', errors='replace')
+    return Result(out, f'exited with code {p.returncode}' if p.returncode else None)
+
+
 class Terminal(Destination_rule):
     def __init__(self, name: str, content: list[str|Expression], arguments: list[Argument], operator: list[str], ignore_all_exceptions=False):
         super().__init__(name, content, arguments, operator, ignore_all_exceptions)
 
-    def eval_item(self, item: PipeItem, pipe: Pipe):
+    def _number_argument(self, key: str, item: PipeItem) -> Optional[float]:
+        value = self._eval_argument(key, item)
+        if not value:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ActionException(self.name, f'"{key}" should be a number')
 
+    def _cwd(self, item: PipeItem) -> str:
+        return self.ensure_string(self._eval_argument('cwd', item) or os.getcwd())
+
+    def _job(self, item: PipeItem) -> Optional[Job]:
         content = self.ensure_string(self._eval_content(item))
 
         self.ensure_not_empty(self.content)
 
         if not content:
-            return
-
-        cwd = self.ensure_string(self._eval_argument('cwd', item) or os.getcwd())
-
-        if not self.simulate:
-            p = subprocess.Popen(shlex.split(content), cwd=cwd, stdout=True)
-
-            out, err = p.communicate()
+            return None
+        return Job([item], content.strip(), shlex.split(content), self._cwd(item))
+
+    def _batches(self, items: list[PipeItem]) -> Iterable[Job]:
+        """Like xargs, the paths of many items are appended to a single command"""
+        first = items[0]
+        content = self.ensure_string(self._eval_content(first))
+        self.ensure_not_empty(content)
+
+        args = shlex.split(content)
+        cwd = self._cwd(first)
+        batch_size = parse_int(self._eval_argument('batch_size', first))
+
+        batch: list[PipeItem] = []
+        length = len(content)
+        for item in items:
+            if batch and (length + len(item.filepath) + 1 > MAX_COMMAND_LENGTH or len(batch) == batch_size):
+                yield Job(batch, content.strip(), args + [item.filepath for item in batch], cwd)
+                batch, length = [], len(content)
+            batch.append(item)
+            length += len(item.filepath) + 1
+
+        if batch:
+            yield Job(batch, content.strip(), args + [item.filepath for item in batch], cwd)
+
+    def _run_all(self, jobs: list[Job], pipe: Pipe, max_parallel: int, timeout: Optional[float]):
+        """Run the jobs with at most `max_parallel` commands at a time, results are applied in order"""
+        if self.simulate:
+            results = [Result('', None) for _ in jobs]
+        elif max_parallel > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(max_parallel) as executor:
+                results = list(executor.map(lambda job: run_command(job.args, job.cwd, timeout), jobs))
         else:
-            out = b''
-            err = False
-
-        item.data['terminal'] = TerminalData('')
-
-        if not err:
-            item.data['terminal'].out = out.decode('utf-8')
-
-        if self._eval_argument('verbose', item) == 'true':
-            if not err:
-                rprint(f'[yellow]Terminal: [green]{content}')
-            else:
-                rprint(f'[yellow]Terminal: [red]{content}')
+            results = [run_command(job.args, job.cwd, timeout) for job in jobs]
+
+        for job, result in zip(jobs, results):
+            # the command may have modified or moved the files, unless it is known to only read them
+            modifies = not self.simulate and self._eval_argument('read_only', job.items[0]) != 'true'
+            for item in job.items:
+                item.data['terminal'] = TerminalData(result.out)
+                if modifies:
+                    pipe.changed(item)
+
+            if self._eval_argument('verbose', job.items[0]) == 'true':
+                if not result.error:
+                    rprint(f'[yellow]Terminal: [green]{job.command}')
+                else:
+                    rprint(f'[yellow]Terminal: [red]{job.command}')
+
+            if result.error:
+                pipe.report(ActionException(self.name, f'"{job.command}" {result.error}'), self.ignore_all_exceptions)
+
+    def _options(self, items: list[PipeItem]) -> tuple[int, Optional[float]]:
+        max_parallel = int(self._number_argument('max_parallel', items[0]) or 1)
+        return max_parallel, self._number_argument('timeout', items[0])
+
+    def _each(self, items: list[PipeItem], make_jobs: Callable[[list[PipeItem]], list[Job]], pipe: Pipe):
+        items = [item for item in items if not item.deleted]
+        if not items:
+            return
+        self._run_all(make_jobs(items), pipe, *self._options(items))
 
-            
+    def eval(self, pipe: Pipe):
+        def make_jobs(items: list[PipeItem]) -> list[Job]:
+            jobs = []
+            for item in items:
+                try:
+                    if job := self._job(item):
+                        jobs.append(job)
+                except ActionException as e:
+                    pipe.report(e, self.ignore_all_exceptions)
+            return jobs
 
+        self._each(list(pipe.items), make_jobs, pipe)
 
+    def eval_all(self, pipe: Pipe):
+        # sorted, so each batch gets the same files on every run
+        self._each(sorted(pipe.items, key=lambda item: item.filepath), lambda items: list(self._batches(items)), pipe)
 
+    def eval_item(self, item: PipeItem, pipe: Pipe):
+        job = self._job(item)
+        if job:
+            self._run_all([job], pipe, 1, self._number_argument('timeout', item))
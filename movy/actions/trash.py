@@ -2,33 +2,181 @@ from ..classes import Destination_rule, Pipe, Expression, Argument, PipeItem
 from ..classes.exceptions import ActionException
 from rich import print as rprint
 import os
+import shutil
+import stat
+from datetime import datetime
+from typing import Iterable, Optional
+from urllib.parse import quote
 from rich.prompt import Confirm
+from .move import Destination
+from .. import journal
+
+
+def home_trash() -> str:
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_home, 'Trash')
+
+def mount_point(filepath: str) -> str:
+    filepath = os.path.realpath(filepath)
+    device = os.stat(filepath).st_dev
+    while (parent := os.path.dirname(filepath)) != filepath and os.stat(parent).st_dev == device:
+        filepath = parent
+    return filepath
+
+
+class TrashCan():
+    """
+    A trash directory of the freedesktop.org trash specification. Files are moved into
+    `files` and a `.trashinfo` with the original path and the deletion date goes into `info`
+    """
+
+    def __init__(self, folder: str, topdir: Optional[str] = None):
+        self.folder = folder
+        # trash directories on other devices store paths relative to their mount point
+        self.topdir = topdir
+
+        self.files_dir = os.path.join(folder, 'files')
+        self.info_dir = os.path.join(folder, 'info')
+        os.makedirs(self.files_dir, mode=0o700, exist_ok=True)
+        os.makedirs(self.info_dir, mode=0o700, exist_ok=True)
+
+        # a name is taken when it is used in files or in info
+        self.names = Destination(self.files_dir)
+        self.names.names.update(name[:-len('.trashinfo')] for name in os.listdir(self.info_dir) if name.endswith('.trashinfo'))
+
+    @classmethod
+    def for_device(cls, filepath: str) -> 'TrashCan':
+        home = home_trash()
+        os.makedirs(home, mode=0o700, exist_ok=True)
+        # trash directories of other devices are named after the user id, which windows does not have
+        if os.stat(filepath).st_dev == os.stat(home).st_dev or not hasattr(os, 'getuid'):
+            return cls(home)
+
+        topdir = mount_point(filepath)
+        uid = os.getuid()
+
+        shared = os.path.join(topdir, '.Trash')
+        try:
+            # the shared trash is only safe to use when it is sticky and is not a link
+            shared_stat = os.lstat(shared)
+            if stat.S_ISDIR(shared_stat.st_mode) and shared_stat.st_mode & stat.S_ISVTX:
+                return cls(os.path.join(shared, str(uid)), topdir)
+        except OSError:
+            pass
+
+        return cls(os.path.join(topdir, f'.Trash-{uid}'), topdir)
+
+    def _reserve(self, filepath: str) -> tuple[str, str]:
+        """Pick a free name and create its .trashinfo, which reserves the name"""
+        basename = os.path.basename(filepath)
+        name = basename
+        stem, extension = os.path.splitext(basename)
+
+        original = os.path.abspath(filepath)
+        if self.topdir:
+            original = os.path.relpath(original, self.topdir)
+
+        info = (
+            '[Trash Info]\n'
+            f'Path={quote(original)}\n'
+            f'DeletionDate={datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}\n'
+        )
+
+        while True:
+            if name in self.names.names:
+                name = self.names.allocate(f'{stem}.', extension)
+            self.names.names.add(name)
+
+            info_path = os.path.join(self.info_dir, name + '.trashinfo')
+            try:
+                fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                # trashed by another program after the listing
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(info)
+            return os.path.join(self.files_dir, name), info_path
+
+    def put(self, filepath: str) -> str:
+        """Move a file into the trash and return where it went"""
+        destination, info_path = self._reserve(filepath)
+        journal.record('trash', filepath, destination, remove=[info_path])
+        try:
+            if os.stat(filepath).st_dev == self.names.device:
+                os.rename(filepath, destination)
+            else:
+                shutil.move(filepath, destination)
+        except OSError:
+            os.remove(info_path)
+            raise
+        return destination
+
 
 class Trash(Destination_rule):
     def __init__(self, name: str, content: list[str|Expression], arguments: list[Argument], operator: list[str], ignore_all_exceptions=False):
         super().__init__(name, content, arguments, operator, ignore_all_exceptions)
 
-    def eval_item(self, item: PipeItem, pipe: Pipe):
-        content = self._eval_content(item)
+        # trash directory of each device, opened once per run of the action
+        self.cans: dict[int, TrashCan] = {}
 
-        if content:
+    def _check(self, item: PipeItem):
+        if self._eval_content(item):
             raise ActionException(self.name, 'this action does not accept content')
+        if not item.isfile:
+            raise ActionException(self.name, 'this action can only trash files')
 
-        if os.path.isfile(item.filepath):
+    def trash_all(self, items: Iterable[PipeItem], pipe: Pipe):
+        """Trash items without asking, each trash directory is opened once"""
+        cans = self.cans
+
+        for item in items:
             if self._eval_argument('silent', item) != 'true':
                 rprint(f'[red]Trash: [green]{os.path.basename(item.filepath)}')
 
             if not self.simulate:
-                if self._eval_argument('confirm', item) != 'false':
-                    choice = Confirm.ask(f'[red]trash "{os.path.basename(item.filepath)}"?', default=False)
-                    if not choice:
-                        return
-                os.system(f'trash "{item.filepath}"')
+                try:
+                    device = item.stat().st_dev
+                    if device not in cans:
+                        cans[device] = TrashCan.for_device(item.filepath)
+                    cans[device].put(item.filepath)
+                except OSError as e:
+                    error = ActionException(self.name, f'cannot trash "{item.filepath}": {e.strerror}')
+                    pipe.report(error, self.ignore_all_exceptions)
+                    continue
+                pipe.moved(item)
 
             item.deleted = True
 
-        else:
-            raise ActionException(self.name, 'this action can only trash files')
+    def eval(self, pipe: Pipe):
+        self.cans = {}
+        super().eval(pipe)
+
+    def eval_all(self, pipe: Pipe):
+        self.cans = {}
+        items = []
+        for item in list(pipe.items):
+            if item.deleted:
+                continue
+            try:
+                self._check(item)
+                items.append(item)
+            except ActionException as e:
+                pipe.report(e, self.ignore_all_exceptions)
 
+        if not items:
+            return
+        if not self.simulate and self._eval_argument('confirm', items[0]) != 'false':
+            if not Confirm.ask(f'[red]trash {len(items)} files?', default=False):
+                return
+
+        self.trash_all(items, pipe)
+
+    def eval_item(self, item: PipeItem, pipe: Pipe):
+        self._check(item)
 
+        if not self.simulate and self._eval_argument('confirm', item) != 'false':
+            choice = Confirm.ask(f'[red]trash "{os.path.basename(item.filepath)}"?', default=False)
+            if not choice:
+                return
 
+        self.trash_all([item], pipe)
@@ -0,0 +1,329 @@
+import os
+import pickle
+from hashlib import sha256
+from time import time
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from . import __version__
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# bump when the layout of the cached parse tree changes
+CACHE_FORMAT = 2
+
+# persistent stores set up by the command line, rules only use them when they are set
+content_store: Optional['ContentStore'] = None
+hash_store: Optional['HashStore'] = None
+duplicate_store: Optional['DuplicateStore'] = None
+rule_stats: Optional['RuleStats'] = None
+
+
+def file_digest(filepath: str) -> str:
+    digest = sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScriptCache():
+    """
+    Stores parsed scripts on disk, keyed by script content and movy version. A script file
+    only keeps its latest entry and at most `limit` entries are kept, the oldest go first
+    """
+
+    def __init__(self, folder: str, limit: int = 100):
+        self.folder = folder
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content: str, source: Optional[str] = None) -> str:
+        digest = sha256()
+        digest.update(f'{__version__}:{CACHE_FORMAT}:'.encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+        if not source:
+            return digest.hexdigest()
+        # entries of the same file share a prefix, so the previous one is found when it changes
+        prefix = sha256(os.path.abspath(source).encode('utf-8')).hexdigest()[:16]
+        return f'{prefix}-{digest.hexdigest()}'
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key + '.pickle')
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                parsed = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return parsed
+
+    def put(self, key: str, parsed: Any):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            # write to a temporary file first, so concurrent runs never read a partial entry
+            tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._prune(key)
+        except OSError:
+            pass
+
+    def _prune(self, key: str):
+        """Remove the older entries of the same file and the oldest entries over the limit"""
+        prefix = key.split('-')[0] + '-' if '-' in key else None
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.pickle') or name == key + '.pickle':
+                continue
+            path = os.path.join(self.folder, name)
+            if prefix and name.startswith(prefix):
+                os.remove(path)
+            else:
+                entries.append(path)
+
+        if len(entries) >= self.limit:
+            entries.sort(key=os.path.getmtime)
+            for path in entries[:len(entries) - self.limit + 1]:
+                os.remove(path)
+
+    def clear(self):
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.folder, name))
+
+    def __repr__(self):
+        return f'ScriptCache(hits: {self.hits}, misses: {self.misses})'
+
+
+class SqliteStore():
+    """Base for caches kept in a sqlite database, with one connection per process"""
+
+    schema = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._connection: Optional['sqlite3.Connection'] = None
+        self._pid = 0
+
+    @property
+    def connection(self) -> 'sqlite3.Connection':
+        # connections cannot be shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            # sqlite3 is only imported by runs that use a store
+            import sqlite3
+
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # losing the last writes of a cache is harmless
+            self._connection.execute('PRAGMA synchronous=OFF')
+            self._connection.executescript(self.schema)
+            self._pid = os.getpid()
+        return self._connection
+
+    def __getstate__(self):
+        # worker processes open their own connection
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+
+class ContentStore(SqliteStore):
+    """
+    Text extracted from files, keyed by the hash of the file content and the extraction
+    parameters. Entries survive renames and moves, and the least recently used ones are
+    evicted when the store grows past `max_size` bytes
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, digest TEXT);
+        CREATE TABLE IF NOT EXISTS content (key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS content_used ON content (used);
+    '''
+
+    def __init__(self, path: str, max_size: int = 64 * 1024 * 1024):
+        super().__init__(path)
+        self.max_size = max_size
+        self._size: Optional[int] = None
+
+    def digest(self, filepath: str, stat: os.stat_result) -> str:
+        """Content hash of a file, only read again when its size, mtime or inode change"""
+        filepath = os.path.abspath(filepath)
+        row = self.connection.execute('SELECT size, mtime, inode, digest FROM digests WHERE path = ?', (filepath,)).fetchone()
+        if row and tuple(row[:3]) == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return row[3]
+
+        digest = file_digest(filepath)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)',
+            (filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, digest)
+        )
+        return digest
+
+    def key(self, filepath: str, stat: os.stat_result, *parameters) -> str:
+        return ':'.join([self.digest(filepath, stat), *map(str, parameters)])
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.connection.execute('SELECT text FROM content WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute('UPDATE content SET used = ? WHERE key = ?', (time(), key))
+        return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode('utf-8'))
+        if size > self.max_size:
+            return
+
+        if self._size is None:
+            self._size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM content').fetchone()[0]
+
+        previous = self.connection.execute('SELECT size FROM content WHERE key = ?', (key,)).fetchone()
+        self.connection.execute('INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?)', (key, text, size, time()))
+        self._size += size - (previous[0] if previous else 0) # type: ignore
+
+        if self._size > self.max_size: # type: ignore
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the store is back to 90% of its budget, with the digests of their files"""
+        target = self.max_size * 0.9
+        rows = self.connection.execute('SELECT key, size FROM content ORDER BY used').fetchall()
+
+        removed = []
+        for key, size in rows:
+            if self._size <= target: # type: ignore
+                break
+            removed.append((key,))
+            self._size -= size # type: ignore
+
+        self.connection.executemany('DELETE FROM content WHERE key = ?', removed)
+        # paths whose content is gone, keys start with the 64 characters of the digest
+        self.connection.execute('DELETE FROM digests WHERE digest NOT IN (SELECT substr(key, 1, 64) FROM content)')
+
+
+class HashStore(SqliteStore):
+    """Perceptual hashes of files, valid while their size, mtime and inode do not change"""
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS hashes (path TEXT, kind TEXT, size INTEGER, mtime INTEGER, inode INTEGER, hash TEXT, PRIMARY KEY (path, kind));
+    '''
+
+    def get(self, filepath: str, stat: os.stat_result, kind: str) -> Optional[int]:
+        row = self.connection.execute(
+            'SELECT size, mtime, inode, hash FROM hashes WHERE path = ? AND kind = ?',
+            (os.path.abspath(filepath), kind)
+        ).fetchone()
+        if row is None or tuple(row[:3]) != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return int(row[3], 16)
+
+    def put(self, filepath: str, stat: os.stat_result, kind: str, value: int):
+        # hashes are stored as hex, sqlite integers are signed
+        self.connection.execute(
+            'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+            (os.path.abspath(filepath), kind, stat.st_size, stat.st_mtime_ns, stat.st_ino, f'{value:x}')
+        )
+
+
+class DuplicateStore(SqliteStore):
+    """
+    Index of files by size, with hashes of their first and last bytes (partial) and of
+    their whole content (full). Hashes are computed only when needed and are cleared
+    when the size, mtime or inode of a file change
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, partial TEXT, full TEXT);
+        CREATE INDEX IF NOT EXISTS files_size ON files (size);
+    '''
+
+    def index(self, files: Iterable[tuple[str, os.stat_result]]):
+        connection = self.connection
+        connection.execute('BEGIN')
+        connection.executemany(
+            '''INSERT INTO files VALUES (?, ?, ?, ?, NULL, NULL) ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size, mtime = excluded.mtime, inode = excluded.inode, partial = NULL, full = NULL
+                WHERE (size, mtime, inode) != (excluded.size, excluded.mtime, excluded.inode)''',
+            ((os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino) for path, stat in files)
+        )
+        connection.execute('COMMIT')
+
+    def shared_sizes(self) -> set[int]:
+        """Sizes of more than one indexed file"""
+        rows = self.connection.execute('SELECT size FROM files GROUP BY size HAVING COUNT(*) > 1')
+        return {row[0] for row in rows}
+
+    def same_size(self, size: int) -> list[tuple[str, int, int, Optional[str], Optional[str]]]:
+        """Path, mtime, inode, partial and full hash of every indexed file with this size"""
+        return self.connection.execute(
+            'SELECT path, mtime, inode, partial, full FROM files WHERE size = ? ORDER BY path', (size,)
+        ).fetchall()
+
+    def set_hash(self, path: str, kind: str, value: str):
+        if kind not in ['partial', 'full']:
+            raise ValueError(f'unknown hash "{kind}"')
+        self.connection.execute(f'UPDATE files SET {kind} = ? WHERE path = ?', (value, path))
+
+    def remove(self, path: str):
+        self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+
+
+class RuleStats(SqliteStore):
+    """
+    Measured time and pass rate of rules, by rule name and by its content and arguments.
+    Older measurements lose weight on every update, so estimates follow recent runs
+    """
+
+    decay = 0.8
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS rule_stats (rule TEXT, signature TEXT, items REAL, passed REAL, seconds REAL, PRIMARY KEY (rule, signature));
+    '''
+
+    def record(self, rule: str, signature: str, items: int, passed: int, seconds: float):
+        self.connection.execute(
+            '''INSERT INTO rule_stats VALUES (?, ?, ?, ?, ?) ON CONFLICT (rule, signature) DO UPDATE SET
+                items = items * ? + excluded.items,
+                passed = passed * ? + excluded.passed,
+                seconds = seconds * ? + excluded.seconds''',
+            (rule, signature, items, passed, seconds, self.decay, self.decay, self.decay)
+        )
+
+    def estimate(self, rule: str, signature: str) -> tuple[Optional[float], Optional[float]]:
+        """Seconds per item of the rule and pass rate of this use of it, None when never measured"""
+        row = self.connection.execute(
+            'SELECT SUM(seconds) / SUM(items) FROM rule_stats WHERE rule = ? AND items > 0', (rule,)
+        ).fetchone()
+        cost = row[0] if row else None
+
+        row = self.connection.execute(
+            'SELECT passed / items FROM rule_stats WHERE rule = ? AND signature = ? AND items > 0', (rule, signature)
+        ).fetchone()
+        selectivity = row[0] if row else None
+
+        return cost, selectivity
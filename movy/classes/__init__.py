@@ -3,5 +3,6 @@ from .command import *
 from .content import *
 from .history import *
 from .pipe import *
+from .snapshot import *
 
 
@@ -1,10 +1,16 @@
 from .pipe import PipeItem, Pipe
 from .command import Input_rule, Destination_rule
 from .history import History
+from .snapshot import SnapshotStore
 import os
-from typing import Optional, List
+from typing import Callable, Optional, List, Iterable
 from rich import print as rprint
 from ..classes.exceptions import ActionException
+from time import perf_counter
+from contextlib import nullcontext
+
+# files per chunk of a streamed block
+STREAM_CHUNK = 1000
 
 class Block:
     def __init__(self, name: str):
@@ -28,25 +34,88 @@ class Block:
 
         return output
 
-    def eval(self, pipe: Optional[Pipe]=None) -> Pipe:
+    def can_stream(self) -> bool:
+        """
+        Blocks where each item is kept or dropped on its own ('and' chains) give the same
+        result when the files go through them a chunk at a time
+        """
+        from ..optimizer import rule_mode
+
+        for i, command in enumerate(self.commands):
+            if isinstance(command, Input_rule):
+                if rule_mode(command, i == 0) not in ['and', 'pass'] or not command.streamable:
+                    return False
+                # rules that add files from the root
+                if type(command).add_callback is not Input_rule.add_callback:
+                    return False
+            elif 'all' in command.operator:
+                return False
+        return True
+
+    def stream_chunk(self) -> int:
+        """Files per chunk from the `stream` metadata key (true or a number), 0 when the block is not streamed"""
+        stream = self.metadata.get('stream')
+        if not stream:
+            return 0
+        if not self.can_stream():
+            rprint(f'[yellow]block "{self.name}" cannot be streamed, only blocks of "and" rules without "all" actions can')
+            return 0
+        if isinstance(stream, int) and not isinstance(stream, bool):
+            return stream
+        return STREAM_CHUNK
+
+    def eval_stream(self, chunk_size: int, paths: Optional[Iterable[str]]=None, snapshots: Optional[SnapshotStore]=None) -> Pipe:
+        """
+        Run the block over the files of the root a chunk at a time, so actions start after the
+        first chunk, and neither the files dropped by the rules nor the data cached for the files
+        of a chunk (e.g. their text) are kept. The returned pipe only has the items that reached
+        the end of the block
+        """
+        if snapshots is None:
+            snapshots = SnapshotStore()
+
+        result = Pipe([], self.root)
+        for items in snapshots.get(self.root, paths).chunks(self.root, chunk_size):
+            pipe = self.eval(Pipe(items, self.root), snapshots=snapshots)
+            result.extend(pipe.items)
+            # the cache is shared with the snapshot, which would keep the content of every file
+            for item in items:
+                item.cache.clear()
+        return result
+
+    def eval(self, pipe: Optional[Pipe]=None, paths: Optional[Iterable[str]]=None, snapshots: Optional[SnapshotStore]=None) -> Pipe:
+        """
+        Run all commands of this block. By default every file of the root enters the pipe,
+        `paths` restricts it to the given files (e.g. the ones changed since the last run).
+
+        Blocks that share `snapshots` list each root only once and share per-file data
+        """
+        if not pipe and (chunk_size := self.stream_chunk()):
+            return self.eval_stream(chunk_size, paths, snapshots)
+
+        # only imported once a block runs, parsing a script does not need them
+        from ..parallel import ParallelFilter, parse_workers
+        from ..optimizer import plan, record, rule_mode
+        from .. import stats
+
         os.chdir(self.root)
+        if snapshots is None:
+            snapshots = SnapshotStore()
         if not pipe:
-            items: list[PipeItem] = []
-            # from rich import print as rprint
-
-            for item in os.listdir(self.root):
-                if os.path.isfile(os.path.join(self.root, item)):
-                    items.append(PipeItem(os.path.join(self.root, item), []))
+            items = snapshots.get(self.root, paths).items(self.root)
 
             pipe = Pipe(items, self.root)
 
         pipe.commands = self.commands
+        pipe.snapshots = snapshots
 
         pipe.ignore_all_exceptions = self.ignore_all_exceptions
 
-        def attach_history_filter(command: Input_rule):
+        workers = parse_workers(self.metadata.get('workers'))
+
+        def attach_history_filter(command: Input_rule, callback: Callable[[PipeItem], bool]):
             def new_callback(pipe_item: PipeItem):
-                result = command.filter_callback(pipe_item)
+                result = callback(pipe_item)
                 if result:
                     self.history.append(command, pipe_item)
                 return result
@@ -54,15 +123,16 @@ class Block:
 
         def attach_history_add(command: Input_rule):
             def new_callback(root: str):
-                items = command.add_callback(root)
-                self.history.append(command, items)
+                items = list(command.add_callback(root))
+                self.history.append(command, items, 'added')
                 return items
             return new_callback
 
 
-        def attach_flags(command: Input_rule):
+        def attach_flags(command: Input_rule, callback: Optional[Callable[[PipeItem], bool]]=None):
+            history_filter = attach_history_filter(command, callback or command.filter_callback)
             def new_filter(pipe_item: PipeItem):
-                result = attach_history_filter(command)(pipe_item)
+                result = history_filter(pipe_item)
                 if 'not' in command.operator:
                     result = not result
                 if result:
@@ -72,32 +142,68 @@ class Block:
 
 
 
-        for i,command in enumerate(self.commands):
-            if isinstance(command, Input_rule):
-                for op in command.operator:
-                    if op in pipe.valid_modes:
-                        pipe.mode = op
-                        break
-                if i==0 and command.default_operator in command.operator:
-                    pipe.mode = 'and'
-                pipe.add(attach_history_add(command))
-                pipe.filter(attach_flags(command))
-            else:
-                if 'simulate' in self.metadata and self.metadata['simulate']:
-                    command.simulate = True
-                try:
-                    if 'all' in command.operator:
-                        try:
-                            command.eval_all(pipe)
-                        except NotImplementedError:
-                            rprint(f"[red] The action '{command.name}' does not support 'all' operator")
-                            continue
+        modes = [rule_mode(command, i == 0) if isinstance(command, Input_rule) else None for i, command in enumerate(self.commands)]
+
+        order = list(range(len(self.commands)))
+        if self.metadata.get('optimize', True) is not False:
+            order = plan(self.commands, modes)
+
+        block_stats = stats.current.block(self) if stats.current else None
+        with block_stats.measure() if block_stats else nullcontext():
+            if block_stats:
+                block_stats.items_in += len(pipe.items)
+
+            for i in order:
+                command = self.commands[i]
+                command_stats = pipe.stats = stats.current.command(self, i) if stats.current else None
+                exceptions = command_stats.exceptions if command_stats else 0
+
+                with command_stats.measure() if command_stats else nullcontext():
+                    if isinstance(command, Input_rule):
+                        pipe.mode = modes[i] # type: ignore
+                        pipe.add(attach_history_add(command))
+
+                        start = perf_counter()
+                        candidates = pipe.candidates()
+                        items = len(candidates)
+                        if command.expensive and workers > 1 and len(candidates) > 1:
+                            pipe.filter(attach_flags(command, ParallelFilter(command, candidates, workers)))
+                        else:
+                            pipe.filter(attach_flags(command, command.batch_filter(candidates)))
+
+                        if pipe.mode == 'and':
+                            record(command, items, len(pipe.items), perf_counter() - start)
                     else:
-                        command.eval(pipe)
-                    self.history.append(command, pipe.items)
-                    if 'reset' in command.operator:
-                        pipe.filter(lambda _:False)
-                except ActionException as e:
-                    rprint(str(e))
+                        if 'simulate' in self.metadata and self.metadata['simulate']:
+                            command.simulate = True
+                        if command_stats:
+                            command_stats.items_in += sum(not item.deleted for item in pipe.items)
+                        try:
+                            if 'all' in command.operator:
+                                try:
+                                    command.eval_all(pipe)
+                                except NotImplementedError:
+                                    rprint(f"[red] The action '{command.name}' does not support 'all' operator")
+                                    continue
+                            else:
+                                command.eval(pipe)
+                            self.history.append(command, pipe.items)
+                            if command_stats:
+                                command_stats.items_out += sum(not item.deleted for item in pipe.items)
+                            if 'reset' in command.operator:
+                                # clearing the pipe is not part of the action
+                                pipe.stats = None
+                                pipe.filter(lambda _:False)
+                        except ActionException as e:
+                            pipe.report(e, False)
+
+                if command_stats and block_stats:
+                    block_stats.exceptions += command_stats.exceptions - exceptions
+
+            pipe.stats = None
+            if block_stats:
+                block_stats.items_out += sum(not item.deleted for item in pipe.items)
+
+        self.history.flush()
 
         return pipe
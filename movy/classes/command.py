@@ -1,10 +1,9 @@
-from typing import Iterable, Any
-from .content import Expression, Argument, Regex
+from typing import Callable, Iterable, Any
+from .content import Expression, Argument, Regex, FoldedContent
 from abc import abstractmethod
 from .pipe import PipeItem, Pipe
 from rich import print as rprint
 from .exceptions import ActionException, RuleException
-from copy import copy
 
 
 class Destination_rule:
@@ -48,6 +47,8 @@ class Destination_rule:
 
         self.arguments_defaults:dict[str,Any] = {}
 
+        self._fold()
+
     def __repr__(self):
         output = f'[green]Action (name: [cyan]{self.name}[green], operator: [cyan]{self.operator}[green])  '
         if self.content:
@@ -68,35 +69,49 @@ class Destination_rule:
 
         return output
 
+    def _fold(self):
+        """Detect content and arguments without expressions, so they are evaluated only once"""
+        self.folded_content = FoldedContent(self.content)
+        self.folded_raw_content = FoldedContent(self.raw_content)
+
+        self.folded_arguments: dict[str, FoldedContent] = {}
+        for argument in self.arguments:
+            if argument.name not in self.folded_arguments:
+                self.folded_arguments[argument.name] = FoldedContent(argument.content)
+
     def _get_argument(self, key:str):
         if key in self.arguments_defaults:
             return self.arguments_defaults[key]
-        for argument in self.arguments:
-            if argument.name == key:
-                return argument.content
+        if key in self.folded_arguments:
+            return self.folded_arguments[key].content
         return None
 
     def _eval_argument(self, key:str, pipe_item: PipeItem):
-        arg = self._get_argument(key)
-        if arg:
-            return Expression.eval_list(arg, pipe_item)
+        if key in self.arguments_defaults:
+            arg = self.arguments_defaults[key]
+            if arg:
+                return Expression.eval_list(arg, pipe_item)
+            return None
+
+        folded = self.folded_arguments.get(key)
+        if folded and folded.content:
+            return folded.eval(pipe_item)
         return None
 
     def _eval_raw_content(self, pipe_item: PipeItem):
-        return Expression.eval_list(self.raw_content, pipe_item)
+        return self.folded_raw_content.eval(pipe_item)
 
     def _eval_content(self, pipe_item: PipeItem):
-        return Expression.eval_list(self.content, pipe_item)
+        return self.folded_content.eval(pipe_item)
 
     def eval(self, pipe: Pipe) -> None:
-        for item in copy(pipe.items):
+        for item in list(pipe.items):
             if item.deleted:
                 continue
             try:
                 self.eval_item(item, pipe)
             except ActionException as e:
-                if not self.ignore_all_exceptions:
-                    rprint(str(e))
+                pipe.report(e, self.ignore_all_exceptions)
 
     @abstractmethod
     def eval_all(self, pipe: Pipe) -> None:
@@ -113,6 +128,15 @@ class Input_rule:
 
     default_operator = 'or'
 
+    # expensive rules are run in worker processes when the block has `workers` set
+    expensive = False
+
+    # estimated seconds per item, used to order 'and' rules until real timings are recorded
+    cost = 2e-6
+    # rules that read or write PipeItem.data keep their relative order when 'and' rules are reordered
+    uses_data = False
+    # rules that compare an item with the other items of the pipe cannot see it a chunk at a time
+    streamable = True
 
     def ensure_string(self, content, msg='You should input a string as argument'):
         if not isinstance(content, str):
@@ -152,6 +176,8 @@ class Input_rule:
 
         self.arguments: list[Argument] = arguments
 
+        self._fold()
+
     def __repr__(self):
         output = f'[green]Rule (name: [cyan]{self.name}[green], operator: [cyan]{self.operator}[green], flags: [cyan]{self.flags}[green])  '
 
@@ -173,12 +199,21 @@ class Input_rule:
 
         return output
 
+    def _fold(self):
+        """Detect content and arguments without expressions, so they are evaluated only once"""
+        self.folded_content = FoldedContent(self.content)
+        self.folded_raw_content = FoldedContent(self.raw_content)
+
+        self.folded_arguments: dict[str, FoldedContent] = {}
+        for argument in self.arguments:
+            if argument.name not in self.folded_arguments:
+                self.folded_arguments[argument.name] = FoldedContent(argument.content)
+
     def _get_argument(self, key:str):
         if key in self.arguments_defaults:
             return self.arguments_defaults[key]
-        for argument in self.arguments:
-            if argument.name == key:
-                return argument.content
+        if key in self.folded_arguments:
+            return self.folded_arguments[key].content
         return None
     
     def _content_to_str(self):
@@ -191,16 +226,22 @@ class Input_rule:
         return output
 
     def _eval_argument(self, key:str, pipe_item: PipeItem):
-        arg = self._get_argument(key)
-        if arg:
-            return Expression.eval_list(arg, pipe_item)
+        if key in self.arguments_defaults:
+            arg = self.arguments_defaults[key]
+            if arg:
+                return Expression.eval_list(arg, pipe_item)
+            return None
+
+        folded = self.folded_arguments.get(key)
+        if folded and folded.content:
+            return folded.eval(pipe_item)
         return None
 
     def _eval_raw_content(self, pipe_item: PipeItem):
-        return Expression.eval_list(self.raw_content, pipe_item)
+        return self.folded_raw_content.eval(pipe_item)
 
     def _eval_content(self, pipe_item: PipeItem):
-        return Expression.eval_list(self.content, pipe_item)
+        return self.folded_content.eval(pipe_item)
 
     @abstractmethod
     def add_callback(self, root:str) -> Iterable[PipeItem]:
@@ -209,3 +250,10 @@ class Input_rule:
     @abstractmethod
     def filter_callback(self, pipe_item: PipeItem) -> bool:
         raise NotImplementedError('filter_callback not implemented')
+
+    def batch_filter(self, items: Iterable[PipeItem]) -> Callable[[PipeItem], bool]:
+        """
+        Filter callback for the items about to be filtered. Rules that are faster on many
+        items at once compute every result here and return a callback that replays them
+        """
+        return self.filter_callback
@@ -1,9 +1,15 @@
+import os
 import re
+from functools import lru_cache
+from types import CodeType
+from typing import Optional
 from ..classes.exceptions import ExpressionException
 from rich import print as rprint
 from .pipe import PipeItem
 from ..utils import extension
 
+regex_regex = re.compile(r'^\s*\/(?P<content>.+)\/(?P<flags>[a-zA-Z]*)\s*$')
+
 class Regex():
     def __init__(self, content:str, flags:list[str]):
         self.content = content
@@ -21,22 +27,21 @@ class Regex():
         self.compiled = re.compile(self.content, flags=self.flags_compiled)
 
     def search(self, string:str):
-        return re.search(self.compiled, string)
+        return self.compiled.search(string)
 
     @staticmethod
     def regex():
-        return re.compile(r'^\s*\/(?P<content>.+)\/(?P<flags>[a-zA-Z]*)\s*$')
+        return regex_regex
 
     @staticmethod
     def is_valid(raw_content:str):
-        regex_regex=Regex.regex()
-        return bool(re.search(regex_regex, raw_content))
+        return bool(regex_regex.search(raw_content))
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def parse(raw_content:str):
-        regex_regex=Regex.regex()
-
-        match = re.search(regex_regex, raw_content)
+        # Regex objects are never modified, so the same text can share one instance
+        match = regex_regex.search(raw_content)
         if not match:
             raise Exception('Invalid Regexp')
 
@@ -46,71 +51,105 @@ class Regex():
 
 
 
+def _upper(text: str) -> str:
+    return text.upper()
+
+
 class Property():
-    def __init__(self, filepath:str, data:dict={}):
+    def __init__(self, filepath:str, data:dict={}, item: Optional[PipeItem]=None):
         self.filepath = filepath
         self.data = data
+        # when available, file types are read from the item's cache
+        self.item = item
 
     def __getitem__(self, name:str):
-        self.__getattr__(name)
+        return getattr(self, name)
 
     def __getattr__(self, name:str):
-        if name == 'islink':
-            from os.path import islink
-            return islink(self.filepath)
-        elif name == 'isfile':
-            from os.path import isfile
-            return isfile(self.filepath)
-        elif name == 'isdir':
-            from os.path import isdir
-            return isdir(self.filepath)
-        elif name in self.data:
-            return self.data[name]
+        data = self.__dict__.get('data', {})
+        if name in data:
+            return data[name]
 
         return False
 
     @property
     def islink(self):
-        from os.path import islink
-        return islink(self.filepath)
+        if self.item:
+            return self.item.islink
+        return os.path.islink(self.filepath)
     @property
     def isfile(self):
-        from os.path import isfile
-        return isfile(self.filepath)
+        if self.item:
+            return self.item.isfile
+        return os.path.isfile(self.filepath)
     @property
     def isdir(self):
-        from os.path import isdir
-        return isdir(self.filepath)
+        if self.item:
+            return self.item.isdir
+        return os.path.isdir(self.filepath)
 
 class Expression():
+    # names computed from the item only when an expression uses them
+    derived_names = {
+        'basename': lambda item: os.path.basename(os.path.splitext(item.filepath)[0]),
+        'filename': lambda item: os.path.basename(item.filepath),
+        'extension': lambda item: extension(item.filepath),
+        'folderpath': lambda item: os.path.split(item.filepath)[0],
+        'property': lambda item: Property(item.filepath, item=item),
+    }
+
     def __init__(self, content:str, ignore_exceptions = False):
         self.content:str = content
         self.ignore_exceptions = ignore_exceptions
 
+        try:
+            # eval() strips leading whitespace of source strings, compile() does not
+            self.code = compile(content.lstrip(' \t'), '<expression>', 'eval')
+        except SyntaxError as e:
+            raise ExpressionException(self.content, f'Invalid syntax: {e.msg}')
+
+        self.names = Expression._collect_names(self.code)
+
+    def __getstate__(self):
+        # code objects cannot be pickled, they are compiled again when loaded
+        state = self.__dict__.copy()
+        del state['code']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.code = compile(self.content.lstrip(' \t'), '<expression>', 'eval')
+
+    @staticmethod
+    def _collect_names(code: CodeType) -> set[str]:
+        names = set(code.co_names)
+        for const in code.co_consts:
+            # comprehensions and lambdas are nested code objects
+            if isinstance(const, CodeType):
+                names |= Expression._collect_names(const)
+        return names
+
     def eval(self, item: PipeItem):
-        import os.path
+        # From PipeItem
+        # 'path': filepath,
+        # 'flags': flags
+        scope = {
+            **item.variables(),
+            'os.path': os.path,
+            'upper': _upper,
+        }
+        for name in self.names & self.derived_names.keys():
+            scope[name] = self.derived_names[name](item)
 
         try:
-            # From PipeItem
-            # 'path': filepath,
-            # 'flags': flags
-            result = eval(self.content, {
-                **item.data,
-                'os.path': os.path,
-                'upper': lambda x:x.upper(),
-                'basename': os.path.basename(os.path.splitext(item.filepath)[0]),
-                'filename': os.path.basename(item.filepath),
-                'extension': extension(item.filepath),
-                'folderpath': os.path.split(item.filepath)[0],
-                'property': Property(item.filepath)
-            })
+            result = eval(self.code, scope)
         except NameError as e:
             raise ExpressionException(self.content, f'Invalid argument {e.name}')
 
         return result
     
     @staticmethod
-    def eval_list(content: 'list[str|Expression]|None', pipe_item: PipeItem) -> str|Regex:
+    def eval_list(content: 'list[str|Expression]|None', pipe_item: Optional[PipeItem]) -> str|Regex:
         if not content:
             return ''
 
@@ -121,7 +160,7 @@ class Expression():
                 continue
 
             try:
-                output += str(item.eval(pipe_item))
+                output += str(item.eval(pipe_item)) # type: ignore
             except ExpressionException as e:
                 if not item.ignore_exceptions:
                     rprint(str(e))
@@ -143,6 +182,27 @@ class Expression():
         return f'Expression({self.content})'
 
 
+class FoldedContent():
+    """Content that is evaluated only once when it has no Expression in it"""
+
+    def __init__(self, content: list[str|Expression]):
+        self.content = content
+        self.is_static = not any(isinstance(item, Expression) for item in content)
+
+        self._value: str|Regex|None = None
+
+    def eval(self, pipe_item: PipeItem) -> str|Regex:
+        if not self.is_static:
+            return Expression.eval_list(self.content, pipe_item)
+
+        if self._value is None:
+            self._value = Expression.eval_list(self.content, None)
+        return self._value
+
+    def __repr__(self):
+        return f'FoldedContent(static: {self.is_static}, content: {self.content})'
+
+
 class Argument():
     def __init__(self, name:str, content:list[str|Expression]):
         self.name = name
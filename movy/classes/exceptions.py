@@ -1,6 +1,7 @@
 
 class RuleException(Exception):
     def __init__(self, action_name: str, message:str):
+        super().__init__(action_name, message)
         self.action_name = action_name
         self.message = message
 
@@ -11,6 +12,7 @@ class RuleException(Exception):
 
 class ActionException(Exception):
     def __init__(self, action_name: str, message:str):
+        super().__init__(action_name, message)
         self.action_name = action_name
         self.message = message
 
@@ -21,6 +23,7 @@ class ActionException(Exception):
 
 class ExpressionException(Exception):
     def __init__(self, content:str, message:str):
+        super().__init__(content, message)
         self.content = content
         self.message = message
 
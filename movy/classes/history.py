@@ -1,20 +1,28 @@
+import json
+import os
+from collections import deque
 from collections.abc import Iterable
-from typing import List, overload
+from typing import NamedTuple, Optional, overload
 from io import StringIO
 from .command import Input_rule, Destination_rule
 from .content import Expression
 from .pipe import PipeItem
-from copy import deepcopy
 
 from rich.console import Console
+
+
+class HistoryRecord(NamedTuple):
+    path: str
+    # 'matched' and 'added' for rules, 'done' for actions
+    outcome: str
+
+
 class HistoryItem:
-    def __init__(self, command: 'Input_rule|Destination_rule'):
+    def __init__(self, command: 'Input_rule|Destination_rule', limit: int):
 
         def expr2str(expressions: list[str|Expression]):
             return ' '.join(a.content if isinstance(a, Expression) else a for a in expressions)
 
-        self.command = command
-
         self.command_name = command.name
         self.operator = command.operator
         self.content = expr2str(command.content)
@@ -25,21 +33,8 @@ class HistoryItem:
         else:
             self.flags = []
 
-        self.pipe:list[PipeItem] = [] 
-
-    @overload
-    def append(self, item: Iterable[PipeItem]):
-        pass
-
-    @overload
-    def append(self, item: PipeItem):
-        pass
-
-    def append(self, item: PipeItem|Iterable[PipeItem]):
-        if isinstance(item, PipeItem):
-            self.pipe.append(item)
-        else:
-            self.pipe.extend(item)
+        # only the last `limit` records are kept
+        self.records: deque[HistoryRecord] = deque(maxlen=limit)
 
     def __repr__(self):
         console = Console()
@@ -51,43 +46,82 @@ class HistoryItem:
         output.write(f' [yellow not italic]content:[white italic] {self.content}')
         output.write(f' [yellow not italic]arguments:[white italic] {self.arguments or "[repr.none]None"}')
 
-        if self.pipe:
-            output.write('\n')
-        for pipe_item in self.pipe:
-            output.write('        ')
-            output.write(repr(pipe_item))
+        if self.records:
             output.write('\n')
+        for record in self.records:
+            output.write(f'        {record.outcome}: {record.path}\n')
         return output.getvalue()
 
 
 class History:
-    def __init__(self):
-        self.history_array : List[HistoryItem] = []
+    """
+    Paths that went through each command of a block. Each command keeps at most `limit`
+    records, older records are dropped or, when `spill_file` is set, appended to it as json lines
+    """
+
+    # records written to the spill file at once
+    spill_batch = 1000
+
+    def __init__(self, limit: int = 1000, spill_file: Optional[str] = None):
+        self.limit = limit
+        self.spill_file = spill_file
+
+        self.items: dict['Input_rule|Destination_rule', HistoryItem] = {}
+        self._spilled: list[str] = []
+
+    @property
+    def history_array(self) -> list[HistoryItem]:
+        return list(self.items.values())
 
     @overload
-    def append(self,command: 'Input_rule|Destination_rule', item: Iterable[PipeItem]):
+    def append(self,command: 'Input_rule|Destination_rule', item: Iterable[PipeItem], outcome: Optional[str]=None):
         pass
 
     @overload
-    def append(self,command: 'Input_rule|Destination_rule', item: PipeItem):
+    def append(self,command: 'Input_rule|Destination_rule', item: PipeItem, outcome: Optional[str]=None):
         pass
 
-    def append(self,command: 'Input_rule|Destination_rule', item: PipeItem|Iterable[PipeItem]):
-        history_item = None
-        for h_item in self.history_array:
-            if h_item.command == command:
-                history_item = h_item
-                break
-
-        if not history_item:
-            history_item = HistoryItem(command)
-            self.history_array.append(history_item)
-
-        history_item.append(deepcopy(item))
+    def append(self,command: 'Input_rule|Destination_rule', item: PipeItem|Iterable[PipeItem], outcome: Optional[str]=None):
+        history_item = self.items.get(command)
+        if history_item is None:
+            history_item = self.items[command] = HistoryItem(command, self.limit)
+
+        if outcome is None:
+            outcome = 'matched' if isinstance(command, Input_rule) else 'done'
+
+        records = history_item.records
+        for pipe_item in ([item] if isinstance(item, PipeItem) else item):
+            if self.spill_file and len(records) == records.maxlen:
+                self._spill(history_item, records[0] if records else HistoryRecord(pipe_item.filepath, outcome))
+            records.append(HistoryRecord(pipe_item.filepath, outcome))
+
+    def _spill(self, history_item: HistoryItem, record: HistoryRecord):
+        self._spilled.append(json.dumps({
+            'command': history_item.command_name,
+            'content': history_item.content,
+            'path': record.path,
+            'outcome': record.outcome,
+        }))
+        if len(self._spilled) >= self.spill_batch:
+            self.flush()
+
+    def flush(self):
+        """Write the pending spilled records"""
+        if not self.spill_file or not self._spilled:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_file)), exist_ok=True)
+        with open(self.spill_file, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(self._spilled) + '\n')
+        self._spilled.clear()
+
+    def clear(self):
+        self.flush()
+        self.items.clear()
 
     def __repr__(self):
         output = StringIO()
         output.write('[blue]History\n')
-        for item in self.history_array:
+        for item in self.items.values():
             output.write(f'    {item}\n')
         return output.getvalue()
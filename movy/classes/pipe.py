@@ -1,23 +1,95 @@
+import os
 from rich import print as rprint
-from typing import Callable, Iterable
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional
+from collections.abc import Set
 
 from ..classes.exceptions import ExpressionException, RuleException
-from copy import copy
 from rich.console import Console
 from io import StringIO
 
+if TYPE_CHECKING:
+    from ..stats import CommandStats
+
 
 class PipeItem():
-    def __init__(self, filepath: str, flags: list[str]):
+    __slots__ = ('filepath', 'flags', 'deleted', 'entry', '_isfile', '_isdir', '_islink', '_stat', 'cache', '_data', 'index')
+
+    def __init__(self, filepath: str, flags: list[str], entry: Optional[os.DirEntry]=None, cache: Optional[dict]=None):
         self.filepath = filepath
         self.flags = flags
 
         self.deleted = False
 
-        self.data:dict = {
-            'path': filepath,
-            'flags': flags
-        }
+        # created on first use, most items never get data
+        self._data: Optional[dict] = None
+
+        # file type and stat are read once, from the directory listing when possible
+        self.entry = entry
+        self._isfile: Optional[bool] = None
+        self._isdir: Optional[bool] = None
+        self._islink: Optional[bool] = None
+        self._stat: Optional[os.stat_result] = None
+
+        # data derived from the file itself (e.g. its text), shared by all items of the same file in a run
+        self.cache: dict = cache if cache is not None else {}
+
+        # position in the items of the pipe that holds it
+        self.index: Optional[int] = None
+
+    def __getstate__(self):
+        # DirEntry cannot be copied, everything already read from it is kept
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['entry'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = {'path': self.filepath, 'flags': self.flags}
+        return self._data
+
+    @data.setter
+    def data(self, data: dict):
+        self._data = data
+
+    def variables(self) -> dict:
+        """Names an expression can use, without creating the data of the item"""
+        if self._data is None:
+            return {'path': self.filepath, 'flags': self.flags}
+        return self._data
+
+    def extra_data(self) -> dict:
+        """Data written by the commands, without path and flags"""
+        if self._data is None:
+            return {}
+        return {key: value for key, value in self._data.items() if key not in ('path', 'flags')}
+
+    @property
+    def isfile(self) -> bool:
+        if self._isfile is None:
+            self._isfile = self.entry.is_file() if self.entry else os.path.isfile(self.filepath)
+        return self._isfile
+
+    @property
+    def isdir(self) -> bool:
+        if self._isdir is None:
+            self._isdir = self.entry.is_dir() if self.entry else os.path.isdir(self.filepath)
+        return self._isdir
+
+    @property
+    def islink(self) -> bool:
+        if self._islink is None:
+            self._islink = self.entry.is_symlink() if self.entry else os.path.islink(self.filepath)
+        return self._islink
+
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = self.entry.stat() if self.entry else os.stat(self.filepath)
+        return self._stat
 
     def __repr__(self):
         console = Console()
@@ -28,27 +100,80 @@ class PipeItem():
         output.write(f'[yellow]filepath:[white] {self.filepath},')
         output.write(console.render_str(
             f'''[yellow] flags:[white] {self.flags},'''
-            f'''[yellow] data:[white] {self.data}'''
+            f'''[yellow] data:[white] {self.variables()}'''
         ).markup)
         output.write('[blue])')
 
         return output.getvalue()
 
+def set_bits(mask: bytearray) -> Iterator[int]:
+    """Indexes of the set bytes of a mask, found with bytearray.find instead of testing each byte"""
+    index = mask.find(1)
+    while index != -1:
+        yield index
+        index = mask.find(1, index + 1)
+
+
+class PipeItems(Set):
+    """The items of a pipe selected by a mask, which has one byte per item of the pipe"""
+
+    def __init__(self, array: list[PipeItem], mask: bytearray):
+        self.array = array
+        self.mask = mask
+
+    def __iter__(self) -> Iterator[PipeItem]:
+        array = self.array
+        for index in set_bits(self.mask):
+            yield array[index]
+
+    def __len__(self) -> int:
+        return self.mask.count(1)
+
+    def __contains__(self, item) -> bool:
+        index = getattr(item, 'index', None)
+        return index is not None and index < len(self.array) and self.array[index] is item and self.mask[index] == 1
+
+    def __repr__(self):
+        return f'PipeItems({[item.filepath for item in self]})'
+
+
 class Pipe():
+    """
+    Items are stored once, in the order they entered the pipe. Which of them are in the
+    pipe, and which were there at the start, are kept as masks over that list, so rules
+    change single bytes instead of copying sets of items
+    """
     valid_modes = ['and', 'or', 'reset', 'pass']
 
-    def __init__(self, items: list[PipeItem], root:str):
-        self.original_items = set(items)
-        self.items = set(items)
+    def __init__(self, items: Iterable[PipeItem], root:str):
+        self.array: list[PipeItem] = []
+        for item in items:
+            self._append(item)
+        self.original_mask = bytearray(b'\x01') * len(self.array)
+        self.mask = bytearray(self.original_mask)
+
         self.root = root
         self.mode: str = 'and' 
 
         from .command import Destination_rule, Input_rule
+        from .snapshot import SnapshotStore
 
         self.commands: list['Input_rule|Destination_rule'] = []
+        self.snapshots: Optional[SnapshotStore] = None
 
         self.ignore_all_exceptions = False
 
+        # statistics of the command being run, only with --stats
+        self.stats: Optional['CommandStats'] = None
+
+    @property
+    def items(self) -> PipeItems:
+        return PipeItems(self.array, self.mask)
+
+    @property
+    def original_items(self) -> PipeItems:
+        return PipeItems(self.array, self.original_mask)
+
     def __repr__(self):
         output = 'Pipe(items: ['
         for item in self.items:
@@ -57,56 +182,94 @@ class Pipe():
         output+='])'
         return output
 
+    def _append(self, item: PipeItem) -> bool:
+        """Give the item a place in this pipe, False when it already has one"""
+        if item.index is not None and item.index < len(self.array) and self.array[item.index] is item:
+            return False
+        item.index = len(self.array)
+        self.array.append(item)
+        return True
+
+    def extend(self, items: Iterable[PipeItem]):
+        """Put items in the pipe, they are not part of the original items"""
+        for item in items:
+            if self._append(item):
+                self.original_mask.append(0)
+                self.mask.append(1)
+            else:
+                self.mask[item.index] = 1
+
+    def moved(self, item: PipeItem, filepath: Optional[str]=None):
+        """Tell the run snapshot that a file was moved to `filepath` (or deleted)"""
+        if self.snapshots:
+            self.snapshots.discard(item.filepath)
+            if filepath:
+                self.snapshots.add(filepath)
+
+    def changed(self, item: PipeItem):
+        """Tell the run snapshot that a file may have been modified"""
+        item.cache.clear()
+        if self.snapshots:
+            self.snapshots.changed(item.filepath)
+
+    def candidates(self) -> PipeItems:
+        """Items the next filter runs on, depending on the mode"""
+        if self.mode in ['reset', 'or']:
+            return self.original_items
+        return self.items
+
+    def report(self, e: Exception, ignore: Optional[bool]=None):
+        """Show an exception raised by a command, unless exceptions are ignored"""
+        if self.stats:
+            self.stats.exceptions += 1
+        if not (self.ignore_all_exceptions if ignore is None else ignore):
+            rprint(str(e))
 
     def add(self, callback: Callable[[str], Iterable[PipeItem]]):
+        before = len(self.items)
         try:
-            for item in callback(self.root):
-                self.items.add(item)
+            self.extend(callback(self.root))
         except (RuleException, ExpressionException) as e:
-            if not self.ignore_all_exceptions:
-                rprint(str(e))
+            self.report(e)
+        if self.stats:
+            self.stats.added += len(self.items) - before
 
     def filter(self, callback: Callable[[PipeItem], bool]):
+        if self.stats:
+            self.stats.items_in += len(self.candidates())
+
+        array, mask = self.array, self.mask
 
         match self.mode:
             # do not filter
             case 'pass':
-                for item in self.items:
+                for index in set_bits(mask):
                     try:
-                        callback(item)
+                        callback(array[index])
                     except (RuleException, ExpressionException) as e:
-                        if not self.ignore_all_exceptions:
-                            rprint(str(e))
-            # remove items that do not match (difference)
-            case 'and':
-                for item in copy(self.items):
+                        self.report(e)
+            # remove items that do not match (intersection), 'reset' starts from the original items
+            case 'and' | 'reset':
+                if self.mode == 'reset':
+                    mask[:] = self.original_mask
+                # clearing the byte of the current item does not disturb set_bits
+                for index in set_bits(mask):
                     try:
-                        result = callback(item)
+                        result = callback(array[index])
                         if result == False:
-                            self.items.remove(item)
+                            mask[index] = 0
                     except (RuleException, ExpressionException) as e:
-                        self.items.remove(item)
-                        if not self.ignore_all_exceptions:
-                            rprint(str(e))
-            # remove items that match from original items (difference)
-            case 'reset':
-                self.items = copy(self.original_items)
-                for item in copy(self.items):
-                    try:
-                        result = callback(item)
-                        if result == False:
-                            self.items.remove(item)
-                    except (RuleException, ExpressionException) as e:
-                        self.items.remove(item)
-                        if not self.ignore_all_exceptions:
-                            rprint(str(e))
+                        mask[index] = 0
+                        self.report(e)
             # add items that match (union)
             case 'or':
-                for item in copy(self.original_items):
+                for index in set_bits(self.original_mask):
                     try:
-                        result = callback(item)
+                        result = callback(array[index])
                         if result == True:
-                            self.items.add(item)
+                            mask[index] = 1
                     except (RuleException, ExpressionException) as e:
-                        if not self.ignore_all_exceptions:
-                            rprint(str(e))
+                        self.report(e)
+
+        if self.stats:
+            self.stats.items_out += len(self.items)
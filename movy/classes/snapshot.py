@@ -0,0 +1,127 @@
+import os
+from typing import Iterable, Iterator, Optional
+from .pipe import PipeItem
+from ..utils import normalize_path
+
+
+class FileRecord():
+    """A file of a snapshot. Its cache is shared by every PipeItem created for that file"""
+
+    def __init__(self, name: str, entry: Optional[os.DirEntry]=None):
+        self.name = name
+        self.entry = entry
+        self.cache: dict = {}
+
+    def __repr__(self):
+        return f'FileRecord(name: {self.name}, cache: {list(self.cache)})'
+
+
+class Snapshot():
+    """Listing of a root, made once and shared by every block that runs on it"""
+
+    def __init__(self, root: str, paths: Optional[Iterable[str]]=None):
+        self.root = normalize_path(root)
+        # when set, only these files are part of the snapshot
+        self.paths = None if paths is None else set(paths)
+
+        self.records: dict[str, FileRecord] = {}
+        self.stale = True
+
+    def _scan(self):
+        previous = self.records
+        self.records = {}
+
+        if self.paths is not None:
+            for filepath in sorted(self.paths):
+                if os.path.dirname(filepath) != self.root:
+                    continue
+                name = os.path.basename(filepath)
+                if os.path.isfile(filepath):
+                    self.records[name] = previous.get(name) or FileRecord(name)
+        else:
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    record = previous.get(entry.name) or FileRecord(entry.name)
+                    record.entry = entry
+                    self.records[entry.name] = record
+
+        self.stale = False
+
+    def items(self, root: str) -> list[PipeItem]:
+        """Fresh items for every file, with paths joined to `root` as written in the script"""
+        if self.stale:
+            self._scan()
+
+        return [
+            PipeItem(os.path.join(root, name), [], record.entry, record.cache)
+            for name, record in self.records.items()
+        ]
+
+    def chunks(self, root: str, size: int) -> Iterator[list[PipeItem]]:
+        """Like `items`, but creates the items `size` at a time"""
+        if self.stale:
+            self._scan()
+
+        # files may be moved while the chunks are used
+        names = list(self.records)
+        for start in range(0, len(names), size):
+            chunk = []
+            for name in names[start:start+size]:
+                record = self.records.get(name)
+                if record is not None:
+                    chunk.append(PipeItem(os.path.join(root, name), [], record.entry, record.cache))
+            yield chunk
+
+    def discard(self, name: str):
+        self.records.pop(name, None)
+        if self.paths is not None:
+            self.paths.discard(os.path.join(self.root, name))
+
+    def add(self, name: str):
+        if self.stale or name in self.records:
+            return
+        self.records[name] = FileRecord(name)
+        if self.paths is not None:
+            self.paths.add(os.path.join(self.root, name))
+
+    def changed(self, name: str):
+        # the file may have been rewritten and other files created, list the root again
+        self.records.pop(name, None)
+        self.stale = True
+
+    def __repr__(self):
+        return f'Snapshot(root: {self.root}, files: {len(self.records)}, stale: {self.stale})'
+
+
+class SnapshotStore():
+    """Snapshots of every root used in one run, shared by all blocks and documents"""
+
+    def __init__(self):
+        self.snapshots: dict[str, Snapshot] = {}
+
+    def get(self, root: str, paths: Optional[Iterable[str]]=None) -> Snapshot:
+        key = normalize_path(root)
+        if key not in self.snapshots:
+            self.snapshots[key] = Snapshot(key, paths)
+        return self.snapshots[key]
+
+    def _find(self, filepath: str) -> tuple[Optional[Snapshot], str]:
+        filepath = normalize_path(filepath)
+        return self.snapshots.get(os.path.dirname(filepath)), os.path.basename(filepath)
+
+    def discard(self, filepath: str):
+        snapshot, name = self._find(filepath)
+        if snapshot:
+            snapshot.discard(name)
+
+    def add(self, filepath: str):
+        snapshot, name = self._find(filepath)
+        if snapshot:
+            snapshot.add(name)
+
+    def changed(self, filepath: str):
+        snapshot, name = self._find(filepath)
+        if snapshot:
+            snapshot.changed(name)
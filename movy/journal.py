@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import IO, Iterator, NamedTuple, Optional
+
+from rich import print as rprint
+
+# journal of the current process, set up by the command line. Actions only record when it is set
+current: Optional['Journal'] = None
+
+
+def record(op: str, source: str, destination: Optional[str], **extra):
+    """Record an operation in the current journal, if there is one"""
+    if current:
+        current.record(op, source, destination, **extra)
+
+
+class Entry(NamedTuple):
+    run: str
+    op: str
+    source: str
+    destination: Optional[str]
+    extra: dict
+
+
+class RunSummary(NamedTuple):
+    run: str
+    operations: int
+    # run that this one undid, if it is an undo
+    undoes: Optional[str]
+    undone: bool
+
+
+class Journal():
+    """
+    Append-only record of every file operation (move, rename, trash), written before
+    the operation is done. Writes are flushed right away, but only synced to disk
+    every `sync_every` records and at the end of each run
+    """
+
+    def __init__(self, path: str, sync_every: int = 256):
+        self.path = path
+        self.sync_every = sync_every
+
+        self.run: Optional[str] = None
+        self._file: Optional[IO[str]] = None
+        self._pending = 0
+
+    def begin_run(self) -> str:
+        """Start a new run, later records are undone together"""
+        self.sync()
+        self.run = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
+        return self.run
+
+    def _write(self, record: dict):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            self.sync()
+
+    def record(self, op: str, source: str, destination: Optional[str], **extra):
+        """Record an operation before it is done, paths are stored as absolute paths"""
+        if self.run is None:
+            self.begin_run()
+
+        self._write({
+            'run': self.run,
+            'op': op,
+            'source': os.path.abspath(source),
+            'destination': destination and os.path.abspath(destination),
+            **extra
+        })
+
+    def sync(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def entries(self) -> Iterator[Entry]:
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut by a crash
+                    continue
+                yield Entry(
+                    record.pop('run'), record.pop('op'), record.pop('source'), record.pop('destination', None), record
+                )
+
+    def runs(self) -> list[RunSummary]:
+        operations: dict[str, int] = {}
+        undoes: dict[str, str] = {}
+
+        for entry in self.entries():
+            operations.setdefault(entry.run, 0)
+            if entry.op == 'undo':
+                undoes[entry.run] = entry.source
+            else:
+                operations[entry.run] += 1
+
+        undone = set(undoes.values())
+        return [
+            RunSummary(run, count, undoes.get(run), run in undone)
+            for run, count in operations.items()
+        ]
+
+    def last_run(self) -> Optional[str]:
+        """Most recent run that was not undone and is not an undo itself"""
+        for summary in reversed(self.runs()):
+            if not summary.undone and not summary.undoes:
+                return summary.run
+        return None
+
+    def undo(self, run: str) -> int:
+        """Move the files of a run back, newest operation first. Returns how many files were restored"""
+        entries = [entry for entry in self.entries() if entry.run == run and entry.op != 'undo']
+
+        self.begin_run()
+        self._write({'run': self.run, 'op': 'undo', 'source': run, 'destination': None})
+
+        restored = 0
+        for entry in reversed(entries):
+            if not entry.destination:
+                rprint(f'[yellow]cannot undo {entry.op} of "{entry.source}", its destination is unknown')
+                continue
+
+            # the operation may not have happened, or the files were moved again since
+            if not os.path.exists(entry.destination):
+                rprint(f'[yellow]skipping "{entry.source}", it was not found at "{entry.destination}"')
+                continue
+            if os.path.exists(entry.source):
+                rprint(f'[yellow]skipping "{entry.source}", a file with this name already exists')
+                continue
+
+            self.record('move', entry.destination, entry.source)
+            try:
+                os.makedirs(os.path.dirname(entry.source), exist_ok=True)
+                shutil.move(entry.destination, entry.source)
+            except OSError as e:
+                rprint(f'[red]cannot restore "{entry.source}": {e}')
+                continue
+
+            for path in entry.extra.get('remove', []):
+                # e.g. the .trashinfo of a trashed file
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            restored += 1
+
+        self.sync()
+        return restored
@@ -0,0 +1,101 @@
+from typing import Optional
+
+from . import cache
+from .classes.command import Input_rule, Destination_rule
+from .classes.pipe import Pipe
+
+# pass rate of rules that were never measured
+DEFAULT_SELECTIVITY = 0.5
+
+
+def signature(command: Input_rule) -> str:
+    arguments = ' '.join(f'{argument.name}:{argument.content}' for argument in command.arguments)
+    return f'{command.operator} {command._content_to_str()} {arguments}'
+
+
+def estimate(command: Input_rule) -> tuple[float, float]:
+    """Seconds per item and fraction of the items that pass the rule"""
+    cost, selectivity = None, None
+    if cache.rule_stats:
+        cost, selectivity = cache.rule_stats.estimate(command.name, signature(command))
+
+    if cost is None:
+        cost = command.cost
+    if selectivity is None:
+        selectivity = DEFAULT_SELECTIVITY
+    return cost, selectivity
+
+
+def rank(command: Input_rule) -> float:
+    # the cheapest rules that remove the most items run first
+    cost, selectivity = estimate(command)
+    return cost / max(1 - selectivity, 0.01)
+
+
+def rule_mode(command: Input_rule, first: bool) -> str:
+    """Pipe mode used by a rule, the first rule of a block defaults to 'and'"""
+    if first and command.default_operator in command.operator:
+        return 'and'
+    for op in command.operator:
+        if op in Pipe.valid_modes:
+            return op
+    return 'and'
+
+
+def is_movable(command: Input_rule) -> bool:
+    """Rules whose result does not depend on flags, data or on the items already in the pipe"""
+    if command.flags:
+        return False
+    if type(command).add_callback is not Input_rule.add_callback:
+        return False
+    # rules that see all the candidates at once (e.g. duplicate) match differently on fewer items
+    if not command.streamable or type(command).batch_filter is not Input_rule.batch_filter:
+        return False
+    if not command.folded_content.is_static:
+        return False
+    return all(folded.is_static for folded in command.folded_arguments.values())
+
+
+def plan(commands: list['Input_rule|Destination_rule'], modes: list[Optional[str]]) -> list[int]:
+    """
+    Order in which the commands of a block run. Runs of consecutive 'and' rules are sorted
+    by rank when the result cannot change: no rule of the run has flags or expressions or
+    looks at all the candidates at once, no later rule brings removed items back ('or'/'reset') and rules that use PipeItem.data
+    keep their relative order
+    """
+    order = list(range(len(commands)))
+
+    runs: list[list[int]] = []
+    run: list[int] = []
+    for i, command in enumerate(commands):
+        if isinstance(command, Input_rule) and modes[i] == 'and':
+            run.append(i)
+            continue
+        if len(run) > 1:
+            runs.append(run)
+        run = []
+        if modes[i] in ['or', 'reset']:
+            # removed items come back, with whatever data and flags they have
+            runs = []
+    if len(run) > 1:
+        runs.append(run)
+
+    for run in runs:
+        if not all(is_movable(commands[i]) for i in run): # type: ignore
+            continue
+
+        ranked = sorted(run, key=lambda i: rank(commands[i])) # type: ignore
+
+        # rules that use data go back to their original order, in the places they got
+        data_rules = [i for i in run if commands[i].uses_data] # type: ignore
+        data_rules.reverse()
+        ranked = [data_rules.pop() if commands[i].uses_data else i for i in ranked] # type: ignore
+
+        order[run[0]:run[-1]+1] = ranked
+
+    return order
+
+
+def record(command: Input_rule, items: int, passed: int, seconds: float):
+    if cache.rule_stats and items:
+        cache.rule_stats.record(command.name, signature(command), items, passed, seconds)
@@ -0,0 +1,104 @@
+import os
+from typing import TYPE_CHECKING, Any, Iterable, NamedTuple, Optional
+
+from . import cache
+from .classes.pipe import PipeItem
+from .classes.command import Input_rule
+from .classes.exceptions import ExpressionException, RuleException
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# one pool per run, created on first use
+_executor: Optional['ProcessPoolExecutor'] = None
+_executor_workers = 0
+
+
+class Outcome(NamedTuple):
+    result: Any
+    data: dict
+    cache: dict
+    error: Optional[Exception]
+
+
+def _init_worker(content_store: Optional[cache.ContentStore], hash_store: Optional[cache.HashStore]):
+    cache.content_store = content_store
+    cache.hash_store = hash_store
+
+
+def _evaluate(command: Input_rule, items: list[PipeItem]) -> list[Outcome]:
+    outcomes = []
+    cached = {item: set(item.cache) for item in items}
+    callback = command.batch_filter(items)
+    for item in items:
+        try:
+            result, error = callback(item), None
+        except (RuleException, ExpressionException) as e:
+            result, error = False, e
+
+        # path and flags belong to the item of the main process
+        data = item.extra_data()
+        new_cache = {key: value for key, value in item.cache.items() if key not in cached[item]}
+        outcomes.append(Outcome(result, data, new_cache, error))
+    return outcomes
+
+
+def get_executor(workers: int) -> 'ProcessPoolExecutor':
+    # multiprocessing is slow to import and most runs never use it
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        shutdown()
+        _executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(cache.content_store, cache.hash_store))
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def parse_workers(value) -> int:
+    """Number of worker processes from the `workers` metadata key (a number or "auto")"""
+    if value == 'auto':
+        return os.cpu_count() or 1
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdecimal():
+        return int(value)
+    return 0
+
+
+class ParallelFilter():
+    """
+    Runs an expensive rule over the items in worker processes. The instance is then used
+    as the filter callback, replaying each outcome (result, captured data, exception) on
+    the items of the main process
+    """
+
+    def __init__(self, command: Input_rule, items: Iterable[PipeItem], workers: int):
+        # chunks are built from sorted paths, so the work split is the same on every run
+        ordered = sorted(items, key=lambda item: item.filepath)
+        chunk_size = max(1, len(ordered) // (workers * 4))
+        chunks = [ordered[i:i+chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+        executor = get_executor(workers)
+        futures = [executor.submit(_evaluate, command, chunk) for chunk in chunks]
+
+        self.outcomes: dict[PipeItem, Outcome] = {}
+        for chunk, future in zip(chunks, futures):
+            self.outcomes.update(zip(chunk, future.result()))
+
+    def __call__(self, pipe_item: PipeItem):
+        outcome = self.outcomes[pipe_item]
+
+        pipe_item.data.update(outcome.data)
+        pipe_item.cache.update(outcome.cache)
+        if outcome.error:
+            raise outcome.error
+
+        return outcome.result
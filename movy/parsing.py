@@ -1,19 +1,25 @@
 from .classes import *
+from .classes.exceptions import ExpressionException
 import re
 from rich import print as rprint
 import yaml
-from typing import Optional, List, Tuple
+from typing import TYPE_CHECKING, Optional, List, Tuple
 from dataclasses import dataclass,field
 from .rules import RULES
 from .actions import ACTIONS
 from rich.rule import Rule
 from rich.panel import Panel
+from .utils import normalize_path
+
+if TYPE_CHECKING:
+    from .cache import ScriptCache
 
 
 class SyntaxError(Exception):
-    def __init__(self, message:str, file:Optional[str]=None, lineno: Optional[int]=None, content:Optional[str]=None):
+    def __init__(self, message:str, file:Optional[str]=None, lineno: Optional[int]=None, content:Optional[str]=None, column: Optional[int]=None):
         self.file = file
         self.lineno = lineno
+        self.column = column
         self.content = content
         self.message = message
 
@@ -23,6 +29,8 @@ class SyntaxError(Exception):
             output += f'File: {self.file}, '
         if self.lineno:
             output += f'line: {self.lineno}'
+        if self.lineno and self.column:
+            output += f', column: {self.column}'
 
         return f'''{output}
 [white]{self.content}
@@ -30,11 +38,24 @@ class SyntaxError(Exception):
 [red]SyntaxError: {self.message}
 '''
 
+# matches escaped brackets, argument brackets, brackets and line breaks
+token_regex = re.compile(r'\\[{}]|{\n|[{}\n]')
+
+@dataclass
+class Token():
+    # text, rule, action, bracket, argument or close
+    type: str
+    value: str
+    line: int
+    column: int
+
 @dataclass
 class BracketToken():
     content: list['str|BracketToken']
     raw:str=''
     type:str = 'bracket'
+    line:int = 0
+    column:int = 0
 
     def to_string(self) -> str:
         output = ''
@@ -68,6 +89,8 @@ class CommandToken():
     raw:str=''
     type:str = 'string'
     arguments: list[ArgumentToken] = field(default_factory=lambda: [])
+    line:int = 0
+    column:int = 0
 
     def __post_init__(self):
         if not self.raw:
@@ -81,6 +104,7 @@ class RuleToken():
     content: list[str|ExpressionToken]
     arguments: list[ArgumentToken]
     flags: list[str]
+    line: int = 0
 
     def __post_init__(self):
         for op in self.operator:
@@ -97,6 +121,7 @@ class ActionToken():
     name: str
     content: list[str|ExpressionToken]
     arguments: list[ArgumentToken]
+    line: int = 0
 
     def __post_init__(self):
         for op in self.operator:
@@ -108,14 +133,27 @@ class ActionToken():
         return re.compile(r'^[\(\)A-Za-z_ ]*->')
 
 
+@dataclass
+class ParsedBlock():
+    name: str
+    commands: list[RuleToken|ActionToken]
+
+
+@dataclass
+class ParsedScript():
+    metadata: dict
+    blocks: list[ParsedBlock]
+
+
 class Document:
-    def __init__(self, file:Optional[str]=None, text:Optional[str]=None):
+    def __init__(self, file:Optional[str]=None, text:Optional[str]=None, cache:Optional['ScriptCache']=None):
         if not file and not text:
             raise Exception('You must specify which file to open')
 
         self.blocks: List[Block] = [] 
         self.root = os.getcwd()
         self.metadata: dict = {}
+        self.cache = cache
         if file:
             self.file = file
             with open(file,'r', encoding='utf-8') as f:
@@ -130,96 +168,106 @@ class Document:
 
     def load(self, content: str):
         try:
-            content = self._remove_comments(content)
-            content = self._parse_metadata(content)
+            parsed = None
+            if self.cache:
+                key = self.cache.key(content, self.file if self.file != 'None' else None)
+                parsed = self.cache.get(key)
+
+            if parsed is None:
+                parsed = self.parse(content)
+                if self.cache:
+                    self.cache.put(key, parsed)
+
+            self.build(parsed)
+        except (SyntaxError, ExpressionException) as e:
+            rprint(str(e))
+            self.blocks = []
 
-            if 'root' in self.metadata:
-                self.root = self.metadata['root']
+    def parse(self, content: str) -> ParsedScript:
+        content = self._remove_comments(content)
+        content = self._parse_metadata(content)
 
-            block_strings = self._split_blocks(content)
+        block_strings = self._split_blocks(content)
 
-            for block_string in block_strings:
-                content, name = self._parse_block_name(block_string)
+        blocks: list[ParsedBlock] = []
+        for line, block_string in block_strings:
+            content, name = self._parse_block_name(block_string, line)
 
-                block = Block(name)
+            grouped_commands = self._group_brackets(content, line)
+            grouped_actions = self._group_actions(grouped_commands)
+            commands = self._parse_commands(grouped_actions)
 
-                if 'ignore_all_exceptions' in self.metadata:
-                    ignore_all_exceptions = bool(self.metadata['ignore_all_exceptions'])
-                else:
-                    ignore_all_exceptions = False
-
-                block.ignore_all_exceptions = ignore_all_exceptions
-
-
-                content = self._remove_empty_lines(content)
-
-                grouped_commands = self._group_brackets(content)
-                grouped_actions = self._group_actions(grouped_commands)
-                commands = self._parse_commands(grouped_actions)
-
-                # print('------grouped_commands')
-                # rprint(grouped_commands)
-                # print('------grouped_actions')
-                # rprint(grouped_actions)
-                # print('------commands')
-                # rprint(commands)
-                # print('----')
-                for command in commands:
-                    if isinstance(command, RuleToken):
-                        if command.name not in RULES:
-                            raise SyntaxError(message='Unknown rule', file=self.file, lineno=self._find_line(self._squash_expressionstokens(command.content)), content=command.name)
-
-                        if 'ignore_exceptions' in self.metadata:
-                            ignore_exceptions = self.metadata['ignore_exceptions']
-                        else:
-                            ignore_exceptions = False
-
-                        block.commands.append(
-                            RULES[command.name](
-                                name=command.name,
-                                operator=command.operator,
-                                content=self._convert_expressions(command.content, ignore_exceptions),
-                                arguments=self._convert_arguments(command.arguments),
-                                flags=command.flags,
-                                ignore_all_exceptions=ignore_all_exceptions
-                            )
-                        )
-                    else:
-                        if command.name not in ACTIONS:
-                            raise SyntaxError(message='Unknown action', file=self.file, lineno=self._find_line(self._squash_expressionstokens(command.content)), content=command.name)
-
-                        if 'ignore_exceptions' in self.metadata:
-                            ignore_exceptions = self.metadata['ignore_exceptions']
-                        else:
-                            ignore_exceptions = True
-
-                        block.commands.append(
-                            ACTIONS[command.name](
-                                name=command.name,
-                                content=self._convert_expressions(command.content, ignore_exceptions),
-                                arguments=self._convert_arguments(command.arguments),
-                                operator=command.operator,
-                                ignore_all_exceptions=ignore_all_exceptions
-                            )
-                        )
+            blocks.append(ParsedBlock(name, commands))
 
-                self.add_block(block)
+        return ParsedScript(self.metadata, blocks)
 
+    def build(self, parsed: ParsedScript):
+        """Instantiate blocks, rules and actions from an already parsed script"""
+        self.metadata = parsed.metadata
+        self.blocks = []
 
-                # print(content)
-            # print(block_strings)
-        except SyntaxError as e:
-            rprint(str(e))
-            self.blocks = []
+        if 'root' in self.metadata:
+            self.root = os.path.expanduser(self.metadata['root'])
 
-    def _squash_expressionstokens(self, tokens: list[str|ExpressionToken]) -> str:
-        output = ''
-        for token in tokens:
-            if isinstance(token, str):
-                output += token
-            else:
-                output += token.content
-        return output
+        if 'ignore_all_exceptions' in self.metadata:
+            ignore_all_exceptions = bool(self.metadata['ignore_all_exceptions'])
+        else:
+            ignore_all_exceptions = False
+
+        history_limit = self.metadata.get('history_limit', 1000)
+        if not isinstance(history_limit, int) or isinstance(history_limit, bool):
+            raise SyntaxError(message='history_limit must be a number', file=self.file, content=str(history_limit))
+        if history_limit < 0:
+            raise SyntaxError(message='history_limit cannot be negative', file=self.file, content=str(history_limit))
+        history_file = self.metadata.get('history_file')
+        if history_file:
+            history_file = os.path.expanduser(history_file)
+
+        for parsed_block in parsed.blocks:
+            block = Block(parsed_block.name)
+            block.ignore_all_exceptions = ignore_all_exceptions
+            block.history = History(history_limit, history_file)
+
+            for command in parsed_block.commands:
+                if isinstance(command, RuleToken):
+                    if command.name not in RULES:
+                        raise SyntaxError(message='Unknown rule', file=self.file, lineno=command.line, content=command.name)
+
+                    if 'ignore_exceptions' in self.metadata:
+                        ignore_exceptions = self.metadata['ignore_exceptions']
+                    else:
+                        ignore_exceptions = False
+
+                    block.commands.append(
+                        RULES[command.name](
+                            name=command.name,
+                            operator=list(command.operator),
+                            content=self._convert_expressions(command.content, ignore_exceptions),
+                            arguments=self._convert_arguments(command.arguments),
+                            flags=list(command.flags),
+                            ignore_all_exceptions=ignore_all_exceptions
+                        )
+                    )
+                else:
+                    if command.name not in ACTIONS:
+                        raise SyntaxError(message='Unknown action', file=self.file, lineno=command.line, content=command.name)
+
+                    if 'ignore_exceptions' in self.metadata:
+                        ignore_exceptions = self.metadata['ignore_exceptions']
+                    else:
+                        ignore_exceptions = True
+
+                    block.commands.append(
+                        ACTIONS[command.name](
+                            name=command.name,
+                            content=self._convert_expressions(command.content, ignore_exceptions),
+                            arguments=self._convert_arguments(command.arguments),
+                            operator=list(command.operator),
+                            ignore_all_exceptions=ignore_all_exceptions
+                        )
+                    )
+
+            self.add_block(block)
 
     def _convert_arguments(self, items: list[ArgumentToken]) -> list[Argument]:
         def convert(item: ArgumentToken) -> Argument:
@@ -244,14 +292,14 @@ class Document:
                 try:
                     commands.append(self._parse_rule(raw_command))
                 except SyntaxError as e:
-                    raise SyntaxError(message=e.message, file=self.file, lineno=self._find_line(raw_command.command),content=raw_command.command)
+                    raise SyntaxError(message=e.message, file=self.file, lineno=raw_command.line, column=raw_command.column, content=raw_command.command)
             elif raw_command.type == 'action':
                 try:
                     commands.append(self._parse_action(raw_command))
                 except SyntaxError as e:
-                    raise SyntaxError(message=e.message, file=self.file, lineno=self._find_line(raw_command.command),content=raw_command.command)
+                    raise SyntaxError(message=e.message, file=self.file, lineno=raw_command.line, column=raw_command.column, content=raw_command.command)
             else:
-                raise SyntaxError(message='Unknown command', file=self.file, lineno=self._find_line(raw_command.command),content=raw_command.command)
+                raise SyntaxError(message='Unknown command', file=self.file, lineno=raw_command.line, column=raw_command.column, content=raw_command.command)
 
         return commands
 
@@ -259,8 +307,10 @@ class Document:
         return ExpressionToken(token.to_string())
 
     def _parse_argument(self, raw_command:BracketToken) -> list[ArgumentToken]:
+        if not raw_command.content:
+            return []
         if isinstance(raw_command.content[0], BracketToken):
-            raise Exception('invalid argument')
+            raise SyntaxError(message='Invalid argument', file=self.file, lineno=raw_command.line, column=raw_command.column)
 
         prev:Optional[ArgumentToken] = None
         grouped:List[ArgumentToken] = []
@@ -269,17 +319,17 @@ class Document:
             if isinstance(token, str):
                 split = token.split(':', 1)
                 if len(split) != 2:
-                    raise Exception('invalid argument name')
+                    raise SyntaxError(message='Invalid argument name', file=self.file, lineno=raw_command.line, column=raw_command.column, content=token)
                 prev = ArgumentToken(split[0], [split[1]])
                 grouped.append(prev)
                 continue
 
             if not prev:
-                raise Exception('invalid argument format')
+                raise SyntaxError(message='Invalid argument format', file=self.file, lineno=raw_command.line, column=raw_command.column)
 
             if isinstance(token, BracketToken):
                 if token.type == 'argument':
-                    raise Exception('you cannot nest arguments')
+                    raise SyntaxError(message='You cannot nest arguments', file=self.file, lineno=token.line, column=token.column)
 
                 prev.content.append(self._parse_expression(token))
 
@@ -312,9 +362,9 @@ class Document:
         rule_operator = rule_start.strip().split()
 
         if any('->' in item for item in rule_content if isinstance(item, str)):
-            raise SyntaxError(message='Actions and rules must be in different lines', file=self.file, lineno=self._find_line(raw_command.command),content=raw_command.command)
+            raise SyntaxError(message='Actions and rules must be in different lines', file=self.file, lineno=raw_command.line, column=raw_command.column, content=raw_command.command)
 
-        return RuleToken(flags=rule_flags, operator=rule_operator, name=rule_name, content=rule_content, arguments=raw_command.arguments)
+        return RuleToken(flags=rule_flags, operator=rule_operator, name=rule_name, content=rule_content, arguments=raw_command.arguments, line=raw_command.line)
 
     def _parse_action(self, raw_command:CommandToken) -> ActionToken:
         # Parse Commands
@@ -337,7 +387,7 @@ class Document:
         # Parse Flags
         flags_regex = re.compile(r'\((.+?)\)')
         if any(re.finditer(flags_regex, rule_start)):
-            raise SyntaxError(message="Isn't possible to attach flags to actions", file=self.file, lineno=self._find_line(rule_start),content=rule_start)
+            raise SyntaxError(message="Isn't possible to attach flags to actions", file=self.file, lineno=raw_command.line, column=raw_command.column, content=rule_start)
 
 
 
@@ -347,125 +397,145 @@ class Document:
 
 
 
-        return ActionToken(operator=rule_operator, name=rule_name, content=rule_content, arguments=raw_command.arguments)
+        return ActionToken(operator=rule_operator, name=rule_name, content=rule_content, arguments=raw_command.arguments, line=raw_command.line)
         # return RawAction(operator='and', name='basename', content=['fatura'], arguments=[Argument('old', ['jose'])])
 
-    def _group_actions(self, tokens:List[BracketToken|str]) -> List[CommandToken]:
-        action_regex = ActionToken.regex()
-        rule_regex = RuleToken.regex()
-
+    def _group_actions(self, tokens:List[BracketToken|Token]) -> List[CommandToken]:
         prev:Optional[CommandToken] = None
         grouped:List[CommandToken] = []
         for item in tokens:
-            if isinstance(item, str) and re.search(rule_regex, item):
-                split = item.split(':', 1)
-                prev = CommandToken(command=split[0], children=[split[1]] if split[1] else [], raw='', type='rule')
+            if isinstance(item, Token) and item.type == 'rule':
+                split = item.value.split(':', 1)
+                prev = CommandToken(command=split[0], children=[split[1]] if split[1] else [], raw='', type='rule', line=item.line, column=item.column)
                 grouped.append(prev)
                 continue
-            if isinstance(item, str) and re.search(action_regex, item):
-                split = item.split('->', 1)
-                prev = CommandToken(command=split[0], children=[split[1]] if split[1] else [], raw='', type='action')
+            if isinstance(item, Token) and item.type == 'action':
+                split = item.value.split('->', 1)
+                prev = CommandToken(command=split[0], children=[split[1]] if split[1] else [], raw='', type='action', line=item.line, column=item.column)
                 grouped.append(prev)
                 continue
 
             if not prev:
-                raise Exception('invalid command')
+                raise SyntaxError(message='Invalid command', file=self.file, lineno=item.line, column=item.column, content=item.value if isinstance(item, Token) else item.to_string())
 
             if isinstance(item, BracketToken) and item.type == 'argument':
                 prev.arguments = self._parse_argument(item)
+            elif isinstance(item, Token):
+                prev.children.append(item.value)
             else:
                 prev.children.append(item)
         
         return grouped
 
-    def _tokenizer(self, content:str):
-
-        def split_with_delimiter(content_list:list[str], pattern:str, delimiter:str): 
-            count = 0
-            tokens = content_list
-
-            while count < len(tokens):
-                tokens[count] = tokens[count].replace('\\'+pattern, '&&&&')
-                split = re.split(pattern, tokens[count], 1)
-                if len(split) > 1:
-                    split.insert(1,delimiter)
-                    tokens.remove(tokens[count])
-                    tokens[slice(count,count)] = split
+    def _tokenizer(self, content:str, line:int=1) -> List[Token]:
+        """Split a block into bracket, argument, rule, action and text tokens in a single pass"""
+        rule_regex = RuleToken.regex()
+        action_regex = ActionToken.regex()
 
-                    tokens[count] = tokens[count].replace('&&&&', pattern)
+        tokens: List[Token] = []
+        pieces: List[str] = []
+        depth = 0
+        line_start = 0
+        text_line = line
+        text_column = 1
+
+        def push_text(text: str, start: int):
+            nonlocal text_line, text_column
+            if not pieces:
+                text_line = line
+                text_column = start - line_start + 1
+            pieces.append(text)
+
+        def flush_text():
+            text = ''.join(pieces)
+            pieces.clear()
+            if not text or text.isspace():
+                return
+
+            token_type = 'text'
+            # only top level text can start a command
+            if depth == 0:
+                if rule_regex.search(text):
+                    token_type = 'rule'
+                elif action_regex.search(text):
+                    token_type = 'action'
+
+            indent = len(text) - len(text.lstrip())
+            tokens.append(Token(token_type, text, text_line, text_column + indent))
+
+        position = 0
+        for match in token_regex.finditer(content):
+            start = match.start()
+            symbol = match.group()
+
+            if start > position:
+                push_text(content[position:start], position)
+            position = match.end()
+
+            # escaped bracket
+            if symbol[0] == '\\':
+                push_text(symbol[1], start)
+                continue
 
-                    count += 2
-                else:
-                    tokens[count] = tokens[count].replace('&&&&', pattern)
-                    count+=1
+            flush_text()
+            column = start - line_start + 1
 
-            return tokens
-        
-        tokens = [content]
+            if symbol == '}':
+                tokens.append(Token('close', symbol, line, column))
+                depth -= 1
+            elif symbol != '\n':
+                tokens.append(Token('bracket' if symbol == '{' else 'argument', '{', line, column))
+                depth += 1
 
-        tokens = split_with_delimiter(tokens, r'{\n', '&')
-        tokens = split_with_delimiter(tokens, r'{', '{')
-        
-        tokens = split_with_delimiter(tokens, r'}', '}')
-        tokens = [ new_item for substring in tokens for new_item in substring.split('\n') ]
+            if symbol.endswith('\n'):
+                line += 1
+                line_start = position
 
-        tokens = list(filter(lambda x: not re.search(r'^ *$', x), tokens))
+        if position < len(content):
+            push_text(content[position:], position)
+        flush_text()
 
         return tokens
 
 
-    def _group_brackets(self, content):
+    def _group_brackets(self, content:str, line:int=1) -> List[BracketToken|Token]:
         
-        tokens = self._tokenizer(content)
+        tokens = self._tokenizer(content, line)
 
         nest_stack:List[BracketToken] = []
-        grouped:List[BracketToken|str] = []
+        grouped:List[BracketToken|Token] = []
         
-        for item in tokens:
-            match item:
-                case '{'|'&':
-                    new_bracket = BracketToken([], '', 'bracket' if item == '{' else 'argument')
+        for token in tokens:
+            match token.type:
+                case 'bracket'|'argument':
+                    new_bracket = BracketToken([], '', token.type, token.line, token.column)
 
                     if len(nest_stack) > 0:
                         nest_stack[-1].content.append(new_bracket)
 
                     nest_stack.append(new_bracket)
-                case '}':
+                case 'close':
                     if len(nest_stack) == 0:
-                        raise SyntaxError(message='Mismatched bracket', file=self.file, lineno=self._find_line(item),content=content)
+                        raise SyntaxError(message='Mismatched bracket', file=self.file, lineno=token.line, column=token.column, content=content)
                     bracket = nest_stack.pop()
                     if len(nest_stack) == 0:
                         grouped.append(bracket)
 
                 case _:
                     if len(nest_stack) == 0:
-                        grouped.append(item)
+                        grouped.append(token)
                     else:
-                        nest_stack[-1].content.append(item)
+                        nest_stack[-1].content.append(token.value)
 
 
         if len(nest_stack) > 0:
-            raise SyntaxError(message='Mismatched bracket', file=self.file, lineno=self._find_line('a'),content=content)
+            raise SyntaxError(message='Mismatched bracket', file=self.file, lineno=nest_stack[-1].line, column=nest_stack[-1].column, content=content)
 
         
         return grouped
 
 
-    def _remove_empty_lines(self, content:str) -> str:
-        empty_lines_regex = re.compile(r'^\s*$\n', flags=re.MULTILINE)
-        return re.sub(empty_lines_regex, '', content)
-
-    def _find_line(self, query:str):
-
-        match = self.content.find(query)
-
-        if match == -1:
-            return 0
-
-        substring = self.content[:match]
-        return substring.count('\n')
-
-    def _parse_block_name(self, content:str) -> Tuple[str,str]:
+    def _parse_block_name(self, content:str, line:int=1) -> Tuple[str,str]:
         block_name_regex = re.compile(r'\[\[(.+?)\]\]')
 
         match = re.search(block_name_regex, content)
@@ -475,26 +545,33 @@ class Document:
         name = match.group(1).strip()
 
         if not re.search(r'^[A-Za-z ]+$', name):
-            raise SyntaxError(message='Block name in wrong format (only letters)', file=self.file, lineno=self._find_line(match.group(0)),content=match.string)
+            raise SyntaxError(message='Block name in wrong format (only letters)', file=self.file, lineno=line+content.count('\n', 0, match.start()),content=match.group(0))
 
-        content = re.sub(block_name_regex, '', content)
+        # blank the name instead of removing it, so token columns still match the source
+        content = re.sub(block_name_regex, lambda m: ' '*len(m.group(0)), content)
 
         return content, name
 
-    def _split_blocks(self, content:str) -> List[str]:
+    def _split_blocks(self, content:str) -> List[Tuple[int,str]]:
         blocks_regex = re.compile(r'\S.+?(?=\[\[.+?]]|\Z)', flags=re.DOTALL|re.MULTILINE)
 
-        matches = re.findall(blocks_regex,content)
+        blocks: List[Tuple[int,str]] = []
+        line = 1
+        position = 0
+        for match in re.finditer(blocks_regex, content):
+            line += content.count('\n', position, match.start())
+            position = match.start()
+            blocks.append((line, match.group(0).rstrip()))
 
-        if not matches:
+        if not blocks:
             raise SyntaxError(message='Empty file', file=self.file, lineno=0,content='')
 
-        return [item.strip() for item in matches]
+        return blocks
 
     def _remove_comments(self, content:str) -> str:
         content = re.sub(r'(\n^)?#.*', '', content)
 
-        single_closed_brackets_regex = re.compile(r'^\s+}\n', flags=re.MULTILINE)
+        single_closed_brackets_regex = re.compile(r'^[ \t]+}\n', flags=re.MULTILINE)
 
         content = re.sub(single_closed_brackets_regex, '}\n', content)
 
@@ -514,9 +591,7 @@ class Document:
         match_dict = match.groupdict()
 
         if match_dict['start'] is None:
-            span = (match.pos, match.pos+len(match_dict['metadata']))
-            error_string = "\n".join(content.splitlines()[span[0]:span[1]])
-            raise SyntaxError(message='Metadata must be at the start of the file', file=self.file, lineno=span[0],content=error_string)
+            raise SyntaxError(message='Metadata must be at the start of the file', file=self.file, lineno=content.count('\n', 0, match.start())+1,content=match.group(0))
 
         metadata = match_dict['metadata'].strip()
 
@@ -533,7 +608,8 @@ class Document:
 
         self.metadata = convert_types(yaml.load(metadata, yaml.BaseLoader))
         
-        return re.sub(metadata_regex, '', content)
+        # replace the metadata by blank lines, so line numbers still match the source
+        return re.sub(metadata_regex, lambda m: '\n'*m.group(0).count('\n'), content)
 
     def add_block(self, block: Block):
         block.root = self.root
@@ -545,13 +621,30 @@ class Document:
         for block in self.blocks:
             rprint(block.__str__())
 
-    def run_blocks(self):
+    def roots(self) -> set[str]:
+        return {normalize_path(block.root) for block in self.blocks}
+
+    def run_blocks(self, changes: Optional[dict[str, Optional[set[str]]]]=None, snapshots: Optional[SnapshotStore]=None):
+        """
+        Run every block of the document. When `changes` is given, only blocks whose root
+        changed are run, and only over the changed paths (None means the whole root).
+
+        Documents run with the same `snapshots` share the listing of their roots
+        """
         is_simulating = False
+        if snapshots is None:
+            snapshots = SnapshotStore()
 
         rprint(Panel.fit(f'[green underline]Running[blue not underline] "{os.path.basename(self.file)}"[green] in [blue]"{self.root}"', border_style='green'))
         cwd = os.getcwd()
 
         for block in self.blocks:
+            paths = None
+            if changes is not None:
+                root = normalize_path(block.root)
+                if root not in changes:
+                    continue
+                paths = changes[root]
 
             if 'simulate' in block.metadata:
                 if block.metadata['simulate'] and not is_simulating:
@@ -561,7 +654,7 @@ class Document:
 
 
             rprint(f'[green underline]evaluating[blue not underline] {block.name}')
-            pipe = block.eval()
+            pipe = block.eval(paths=paths, snapshots=snapshots)
             if not pipe.items:
                 rprint(f'    [grey50]nothing to do')
             print('')
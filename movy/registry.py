@@ -0,0 +1,29 @@
+from importlib import import_module
+from typing import Any, Iterator, Mapping
+
+
+class Registry(Mapping[str, Any]):
+    """
+    Names of rules or actions mapped to "module:Class". A module is only imported the first
+    time its class is looked up, so scripts don't pay for the dependencies of unused commands
+    """
+
+    def __init__(self, package: str, paths: dict[str, str]):
+        self.package = package
+        self.paths = paths
+        self.loaded: dict[str, Any] = {}
+
+    def __getitem__(self, name: str):
+        if name not in self.loaded:
+            module, class_name = self.paths[name].split(':')
+            self.loaded[name] = getattr(import_module(f'.{module}', self.package), class_name)
+        return self.loaded[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
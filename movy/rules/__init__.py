@@ -1,24 +1,15 @@
-from .basename import Basename
-from .pdf_template import PDF_Template
-from .extension import Extension
-from .path import Path
-from .file import File
-from .hasproperty import HasProperty
-from .filecontent import FileContent
-from .ifexpression import IfExpression
-from .keywords import Keywords
-
-RULES = {
-    'basename': Basename,
-    'extension': Extension,
-    'path': Path,
-    'file': File,
-    'pdf_template': PDF_Template,
-    'hasproperty': HasProperty,
-    'filecontent': FileContent,
-    'if': IfExpression,
-    'keywords': Keywords,
-}
-
-
-
+from ..registry import Registry
+
+# rule modules are imported when a script first uses them
+RULES = Registry(__name__, {
+    'basename': 'basename:Basename',
+    'extension': 'extension:Extension',
+    'path': 'path:Path',
+    'file': 'file:File',
+    'pdf_template': 'pdf_template:PDF_Template',
+    'hasproperty': 'hasproperty:HasProperty',
+    'filecontent': 'filecontent:FileContent',
+    'if': 'ifexpression:IfExpression',
+    'keywords': 'keywords:Keywords',
+    'duplicate': 'duplicate:Duplicate',
+})
@@ -0,0 +1,172 @@
+from ..classes import Input_rule, Expression, PipeItem, Argument
+import os
+from hashlib import sha256
+from typing import Callable, Iterable, Optional
+from ..classes.exceptions import RuleException
+from ..cache import DuplicateStore
+from .. import cache
+from rich import print as rprint
+
+# bytes read from the start and from the end of a file for the partial hash
+PARTIAL_SIZE = 8 * 1024
+
+
+def partial_hash(filepath: str, size: int) -> str:
+    digest = sha256()
+    with open(filepath, 'rb') as f:
+        digest.update(f.read(PARTIAL_SIZE))
+        if size > PARTIAL_SIZE:
+            f.seek(max(PARTIAL_SIZE, size - PARTIAL_SIZE))
+            digest.update(f.read(PARTIAL_SIZE))
+    return digest.hexdigest()
+
+def full_hash(filepath: str) -> str:
+    return cache.file_digest(filepath)
+
+
+class IndexedFile():
+    def __init__(self, path: str, mtime: int, inode: int, partial: Optional[str], full: Optional[str]):
+        self.path = path
+        self.mtime = mtime
+        self.inode = inode
+        self.partial = partial
+        self.full = full
+
+
+class Duplicate(Input_rule):
+    """
+    Matches files with the same content as another file, which may be in any root
+    seen in this or in previous runs. The oldest file of each group is the original
+    """
+
+    cost = 5e-5
+    uses_data = True
+    streamable = False
+
+    def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
+        super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
+
+        # without the persistent index, only files seen by this rule are compared
+        self._memory_store: Optional[DuplicateStore] = None
+
+    @property
+    def store(self) -> DuplicateStore:
+        if cache.duplicate_store:
+            return cache.duplicate_store
+        if self._memory_store is None:
+            self._memory_store = DuplicateStore(':memory:')
+        return self._memory_store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_memory_store'] = None
+        return state
+
+    def _hash(self, store: DuplicateStore, size: int, file: IndexedFile, kind: str) -> Optional[str]:
+        value = getattr(file, kind)
+        if value is not None:
+            return value
+
+        try:
+            if kind == 'partial':
+                value = partial_hash(file.path, size)
+            # small files were already read completely by the partial hash
+            elif size <= PARTIAL_SIZE * 2:
+                value = self._hash(store, size, file, 'partial')
+            else:
+                value = full_hash(file.path)
+        except OSError:
+            store.remove(file.path)
+            return None
+
+        store.set_hash(file.path, kind, value) # type: ignore
+        setattr(file, kind, value)
+        return value
+
+    def _group(self, store: DuplicateStore, size: int, files: list[IndexedFile], kind: str) -> list[list[IndexedFile]]:
+        groups: dict[str, list[IndexedFile]] = {}
+        for file in files:
+            value = self._hash(store, size, file, kind)
+            if value is not None:
+                groups.setdefault(value, []).append(file)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def _is_valid(self, store: DuplicateStore, size: int, file: IndexedFile) -> bool:
+        """Indexed files from other runs may have been moved, deleted or modified"""
+        try:
+            stat = os.stat(file.path)
+        except OSError:
+            store.remove(file.path)
+            return False
+
+        if (stat.st_size, stat.st_mtime_ns, stat.st_ino) != (size, file.mtime, file.inode):
+            store.index([(file.path, stat)])
+            return False
+        return True
+
+    def batch_filter(self, items: Iterable[PipeItem]) -> Callable[[PipeItem], bool]:
+        items = list(items)
+        outcomes: dict[PipeItem, bool|Exception] = {}
+        groups: dict[PipeItem, tuple[str, str]] = {}
+
+        def callback(pipe_item: PipeItem) -> bool:
+            outcome = outcomes.get(pipe_item, False)
+            if isinstance(outcome, Exception):
+                raise outcome
+
+            if pipe_item in groups:
+                pipe_item.data['duplicate_group'], pipe_item.data['original'] = groups[pipe_item]
+            if self._eval_argument('verbose', pipe_item) == 'true' and outcome:
+                rprint(f'[yellow]duplicate: [green]{pipe_item.filepath} [white]of [cyan]{pipe_item.data["original"]}')
+            return outcome
+
+        # "duplicate:" leaves an empty string as content
+        if any(self.content):
+            error = RuleException(self.name, 'this rule only accepts arguments as input')
+            outcomes.update((item, error) for item in items)
+            return callback
+        if not items:
+            return callback
+
+        store = self.store
+        newest = self._eval_argument('original', items[0]) == 'newest'
+
+        stats: dict[PipeItem, os.stat_result] = {}
+        for item in items:
+            try:
+                if not item.isfile:
+                    raise OSError()
+                stats[item] = item.stat()
+            except OSError:
+                outcomes[item] = RuleException(self.name, f'cannot read "{item.filepath}"')
+
+        by_path = {os.path.abspath(item.filepath): item for item in stats}
+        store.index((path, stats[item]) for path, item in by_path.items())
+
+        # only sizes shared by other indexed files can have copies, empty files have nothing to compare
+        sizes = {stat.st_size for stat in stats.values()} & store.shared_sizes()
+        sizes.discard(0)
+
+        # files are compared by size, then by their first and last bytes and only then by their whole content
+        for size in sorted(sizes):
+            files = [IndexedFile(*row) for row in store.same_size(size)]
+            if len(files) < 2:
+                continue
+
+            files = [file for file in files if file.path in by_path or self._is_valid(store, size, file)]
+
+            for partial_group in self._group(store, size, files, 'partial'):
+                for group in self._group(store, size, partial_group, 'full'):
+                    original = (max if newest else min)(group, key=lambda file: (file.mtime, file.path))
+
+                    for file in group:
+                        item = by_path.get(file.path)
+                        if item is None:
+                            continue
+                        groups[item] = (file.full[:12], original.path) # type: ignore
+                        outcomes[item] = file is not original
+
+        return callback
+
+    def filter_callback(self, pipe_item: PipeItem) -> bool:
+        return self.batch_filter([pipe_item])(pipe_item)
@@ -8,7 +8,7 @@ class File(Input_rule):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
     def filter_callback(self, pipe_item: PipeItem) -> bool:
-        content = Expression.eval_list(self.content, pipe_item)
+        content = self._eval_content(pipe_item)
         path_basename = basename(pipe_item.filepath)
 
         if not content:
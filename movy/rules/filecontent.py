@@ -1,6 +1,7 @@
 from ..classes import Input_rule, Regex, Expression, PipeItem, Argument
 from ..utils import extension, parse_int
 from ..classes.exceptions import RuleException
+from .. import cache
 from rich import print as rprint
 from unidecode import unidecode
 
@@ -32,7 +33,37 @@ def get_file_content(file:str, max_lines=10, max_line_length=200, max_pages = 10
 
     return unidecode(file_content)
 
+def stored_file_content(pipe_item: PipeItem, max_lines=10, max_line_length=200, max_pages = 10) -> str:
+    """File content from the persistent content store, only pdfs are worth storing"""
+    store = cache.content_store
+    if not store or extension(pipe_item.filepath) != 'pdf':
+        return get_file_content(pipe_item.filepath, max_lines, max_line_length, max_pages)
+
+    try:
+        key = store.key(pipe_item.filepath, pipe_item.stat(), max_lines, max_line_length, max_pages)
+    except OSError:
+        return get_file_content(pipe_item.filepath, max_lines, max_line_length, max_pages)
+
+    file_content = store.get(key)
+    if file_content is None:
+        file_content = get_file_content(pipe_item.filepath, max_lines, max_line_length, max_pages)
+        store.put(key, file_content)
+
+    return file_content
+
+def cached_file_content(pipe_item: PipeItem, max_lines=10, max_line_length=200, max_pages = 10) -> str:
+    """File content shared by every rule and block that reads the same file with the same limits"""
+    key = ('file_content', max_lines, max_line_length, max_pages)
+    if key not in pipe_item.cache:
+        pipe_item.cache[key] = stored_file_content(pipe_item, max_lines, max_line_length, max_pages)
+
+    return pipe_item.cache[key]
+
 class FileContent(Input_rule):
+    expensive = True
+    cost = 1e-3
+    uses_data = True
+
     def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
@@ -48,11 +79,8 @@ class FileContent(Input_rule):
         max_lines = parse_int(self._eval_argument('max_lines', pipe_item)) or 10
         linelength = parse_int(self._eval_argument('linelength', pipe_item)) or 10
 
-        if 'file_content' in pipe_item.data:
-            file_content = pipe_item.data['file_content']
-        else:
-            file_content = get_file_content(pipe_item.filepath, max_lines, linelength, max_pages)
-            pipe_item.data['file_content'] = file_content
+        file_content = cached_file_content(pipe_item, max_lines, linelength, max_pages)
+        pipe_item.data['file_content'] = file_content
 
         match = content.search(file_content)
 
@@ -2,6 +2,8 @@ from ..classes import Input_rule, Regex, Expression, PipeItem, Argument, Propert
 from ..classes.exceptions import RuleException
 
 class HasProperty(Input_rule):
+    cost = 5e-6
+
     def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
@@ -18,7 +20,7 @@ class HasProperty(Input_rule):
         if content not in supported_properties:
             raise RuleException(self.name, 'unknown property')
 
-        properties = Property(pipe_item.filepath, pipe_item.data)
+        properties = Property(pipe_item.filepath, pipe_item.data, pipe_item)
 
         return bool(properties[content])
 
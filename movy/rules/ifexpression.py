@@ -4,13 +4,17 @@ from rich import print as rprint
 
 
 class IfExpression(Input_rule):
+    cost = 1e-5
+    # the whole content is python, evaluated with the data of the item
+    uses_data = True
+
     def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
-    def filter_callback(self, pipe_item: PipeItem) -> bool:
-        content = self._content_to_str()
+        self.expression = Expression(self._content_to_str(), ignore_exceptions=False)
 
-        expression = Expression(content, ignore_exceptions=False).eval(pipe_item)
+    def filter_callback(self, pipe_item: PipeItem) -> bool:
+        expression = self.expression.eval(pipe_item)
 
         return bool(expression)
 
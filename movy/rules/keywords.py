@@ -1,13 +1,17 @@
 from ..classes import Input_rule, Regex, Expression, PipeItem, Argument
 from ..utils import parse_int
 from ..classes.exceptions import RuleException
-from .filecontent import get_file_content
+from .filecontent import cached_file_content
 import re
 from os.path import splitext, basename
 from fnmatch import fnmatch
 
 
 class Keywords(Input_rule):
+    expensive = True
+    cost = 1e-3
+    uses_data = True
+
     def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
@@ -41,11 +45,8 @@ class Keywords(Input_rule):
                     continue
 
             if not file_content:
-                if 'file_content' in pipe_item.data:
-                    file_content = pipe_item.data['file_content']
-                else:
-                    file_content = get_file_content(pipe_item.filepath, max_lines, linelength, max_pages)
-                    pipe_item.data['file_content'] = file_content
+                file_content = cached_file_content(pipe_item, max_lines, linelength, max_pages)
+                pipe_item.data['file_content'] = file_content
                 if self._eval_argument('verbose', pipe_item) == 'true':
                     print(file_content)
 
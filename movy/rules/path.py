@@ -7,7 +7,7 @@ class Path(Input_rule):
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
     def filter_callback(self, pipe_item: PipeItem) -> bool:
-        content = Expression.eval_list(self.content, pipe_item)
+        content = self._eval_content(pipe_item)
 
         if not content:
             raise RuleException(self.name, 'content field is empty')
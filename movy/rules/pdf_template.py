@@ -1,73 +1,208 @@
 from ..classes import Input_rule, Regex, Expression, PipeItem, Argument
-from os.path import join
-from ..utils import extension, tmp_folder
-from ..classes.exceptions import RuleException
+import os
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+from ..utils import extension, parse_int
+from ..classes.exceptions import RuleException, ExpressionException
+from .. import cache
 from rich import print as rprint
 
-def pdf2img(input_file: str, output_name: str) -> str:
-    """Converts pdf to image and generates a file by page"""
+if TYPE_CHECKING:
+    import numpy as np
+
+# resolution used to render pages, lower is faster and is usually enough to compare layouts
+DEFAULT_DPI = 50
+
+# memory used by each stack of pages scored at once
+BATCH_BYTES = 32 * 1024 * 1024
+
+# perceptual hashes are computed from a tiny render of the page
+HASH_DPI = 12
+# out of 64 bits, pages with the same layout are usually within 8
+DEFAULT_HASH_DISTANCE = 16
+
+
+def render_first_page(input_file: str, dpi=DEFAULT_DPI) -> 'Optional[np.ndarray]':
+    """Renders the first page of a pdf straight into a grayscale array, with values between 0 and 1"""
 
     if extension(input_file) != 'pdf':
-        return ""
+        return None
 
     import fitz
+    import numpy as np
 
     # Open the document
     pdfIn = fitz.open(input_file) # type: ignore
 
     if pdfIn.page_count <= 0:
-        return ""
+        pdfIn.close()
+        return None
 
     page = pdfIn[0] # first page
 
-    pix = page.get_pixmap(alpha=False)
-    pix.save(join(tmp_folder, output_name))
-    
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    # rows may be padded, stride is the real length of a row
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
     pdfIn.close()
 
-    return join(tmp_folder, output_name)
+    return image.astype(np.float64) / 255
+
+def load_image(input_file: str, dpi=DEFAULT_DPI) -> 'Optional[np.ndarray]':
+    """Grayscale array of a pdf (first page) or an image file"""
+    if extension(input_file) == 'pdf':
+        return render_first_page(input_file, dpi)
 
-def pdf_similarity(first_pdf:str, second_pdf:str) -> int:
-    """Return a score based in the visual similarity between two pdfs"""
-    from skimage.metrics import structural_similarity
     from skimage.io import imread
-    from skimage.transform import resize
     from skimage.color import rgb2gray
+    from skimage.util import img_as_float
+
+    image = imread(input_file)
+    if image.ndim == 3:
+        image = rgb2gray(image[..., :3])
+    return img_as_float(image)
+
+def batch_similarity(template: 'np.ndarray', images: 'np.ndarray') -> 'np.ndarray':
+    """
+    SSIM of each image of a (count, height, width) stack against the template, computed for
+    the whole stack at once. Gives the same scores as skimage's structural_similarity
+    with its default 7x7 window and data_range=1
+    """
+    import numpy as np
+    from scipy.ndimage import uniform_filter
+
+    window = 7
+    c1 = 0.01 ** 2
+    c2 = 0.03 ** 2
+    # sample covariance
+    cov_norm = window ** 2 / (window ** 2 - 1)
+
+    def local_mean(array):
+        return uniform_filter(array, size=(1, window, window))
+
+    x = template[None].astype(np.float64)
+    y = images.astype(np.float64)
+
+    ux = local_mean(x)
+    uy = local_mean(y)
+    vx = cov_norm * (local_mean(x * x) - ux * ux)
+    vy = cov_norm * (local_mean(y * y) - uy * uy)
+    vxy = cov_norm * (local_mean(x * y) - ux * uy)
+
+    ssim = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux ** 2 + uy ** 2 + c1) * (vx + vy + c2))
+
+    # borders are affected by the filter padding
+    pad = (window - 1) // 2
+    return ssim[:, pad:-pad, pad:-pad].mean(axis=(1, 2))
+
+def similarity(template: 'np.ndarray', image: 'np.ndarray') -> float:
+    """SSIM between a preprocessed template and an image, which is resized to the template shape"""
+    from skimage.transform import resize
+
+    if image.shape != template.shape:
+        image = resize(image, template.shape)
+
+    return float(batch_similarity(template, image[None])[0])
+
+def dhash(image: 'np.ndarray') -> int:
+    """64 bit difference hash: whether each pixel of a 8x9 thumbnail is brighter than its right neighbour"""
+    import numpy as np
+    from skimage.transform import resize
+
+    thumbnail = resize(image, (8, 9), anti_aliasing=True)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
 
-    if extension(first_pdf) ==  'pdf':
-        first = imread(pdf2img(first_pdf, 'first.png'))
-    else:
-        first = imread(first_pdf)
+def page_hash(input_file: str, stat: os.stat_result) -> Optional[int]:
+    """dHash of the first page of a pdf, kept in the hash store between runs"""
+    store = cache.hash_store
+    if store:
+        value = store.get(input_file, stat, 'dhash')
+        if value is not None:
+            return value
 
-    if extension(second_pdf) ==  'pdf':
-        second = imread(pdf2img(second_pdf, 'second.png'))
-    else:
-        second = imread(second_pdf)
+    image = render_first_page(input_file, HASH_DPI)
+    if image is None:
+        return None
 
-    # shape to the same size
-    second = resize(second, first.shape)
-    # second = downscale_local_mean(second, first.shape)
+    value = dhash(image)
+    if store:
+        store.put(input_file, stat, 'dhash', value)
+    return value
 
-    # Convert images to grayscale
-    first_gray = rgb2gray(first)
-    second_gray = rgb2gray(second)
+def pdf_similarity(first_pdf:str, second_pdf:str, dpi=DEFAULT_DPI) -> float:
+    """Return a score based in the visual similarity between two pdfs"""
+    first = load_image(first_pdf, dpi)
+    second = load_image(second_pdf, dpi)
 
-    # Compute SSIM between two images
-    score, _ = structural_similarity(first_gray, second_gray, full=True)
+    if first is None or second is None:
+        return 0
 
-    return score
+    return similarity(first, second)
 
 
 class PDF_Template(Input_rule):
+    expensive = True
+    cost = 2e-2
+    uses_data = True
 
     def __init__(self, name: str, operator:list[str], content: list[str|Expression], arguments: list[Argument], flags: list[str], ignore_all_exceptions=False):
 
-        self.base_file_png = ''
+        # preprocessed base files, by path and resolution
+        self.templates: dict[tuple[str, int], 'np.ndarray'] = {}
+        self.template_hashes: dict[str, Optional[int]] = {}
         super().__init__(name,operator,content,arguments,flags, ignore_all_exceptions)
 
-    def filter_callback(self, pipe_item: PipeItem) -> bool:
-
-        if self.content:
+    def _template(self, base_file: str, dpi: int) -> 'np.ndarray':
+        key = (base_file, dpi)
+        if key not in self.templates:
+            try:
+                template = render_first_page(base_file, dpi)
+            except Exception:
+                template = None
+            if template is None:
+                raise RuleException(self.name, f'cannot render base_file "{base_file}"')
+            self.templates[key] = template
+
+        return self.templates[key]
+
+    def _template_hash(self, base_file: str) -> Optional[int]:
+        if base_file not in self.template_hashes:
+            try:
+                self.template_hashes[base_file] = page_hash(base_file, os.stat(base_file))
+            except Exception:
+                self.template_hashes[base_file] = None
+        return self.template_hashes[base_file]
+
+    def _hash(self, pipe_item: PipeItem) -> Optional[int]:
+        key = ('dhash',)
+        if key not in pipe_item.cache:
+            try:
+                pipe_item.cache[key] = page_hash(pipe_item.filepath, pipe_item.stat())
+            except Exception:
+                # the file is reported by the full comparison
+                pipe_item.cache[key] = None
+        return pipe_item.cache[key]
+
+    def _is_candidate(self, pipe_item: PipeItem, base_file: str, max_distance: int) -> bool:
+        """Cheap check of the page layout, only pages with a close perceptual hash are compared with SSIM"""
+        if max_distance >= 64:
+            return True
+
+        template_hash = self._template_hash(base_file)
+        item_hash = self._hash(pipe_item)
+        if template_hash is None or item_hash is None:
+            return True
+
+        return (template_hash ^ item_hash).bit_count() <= max_distance
+
+    def _check(self, pipe_item: PipeItem) -> Optional[tuple[str, int]]:
+        """
+        Validates the arguments for an item and returns the base file and resolution it
+        is compared with, or None when the perceptual hash already rules it out
+        """
+
+        # "pdf_template: {" leaves an empty string as content
+        if any(self.content):
             raise RuleException(self.name, 'this rule only accepts arguments as input')
         if extension(pipe_item.filepath) != 'pdf':
             raise RuleException(self.name, 'this rule only support pdf files')
@@ -81,10 +216,27 @@ class PDF_Template(Input_rule):
         elif extension(base_file) != 'pdf':
             raise RuleException(self.name, 'base_file should be a pdf file')
 
-        if not self.base_file_png:
-            self.base_file_png = pdf2img(base_file, 'first.png')
+        self._target_score(pipe_item)
+
+        dpi = parse_int(self._eval_argument('dpi', pipe_item)) or DEFAULT_DPI
+
+        max_distance = parse_int(self._eval_argument('hash_distance', pipe_item))
+        if max_distance is None:
+            max_distance = DEFAULT_HASH_DISTANCE
+
+        base_file = os.path.expanduser(base_file)
+        if not self._is_candidate(pipe_item, base_file, max_distance):
+            if self._eval_argument('verbose', pipe_item) == 'true':
+                rprint('[yellow]pdf_template')
+                rprint(f'[blue]file:[green] {pipe_item.filepath}')
+                rprint(f'[blue]base_file:[green] {base_file}')
+                rprint(f'[blue]layout: [red]hash distance > {max_distance}')
+                rprint('-----')
+            return None
 
-        second = pdf2img(pipe_item.filepath, 'second.png')
+        return base_file, dpi
+
+    def _target_score(self, pipe_item: PipeItem) -> int:
         target_score = self._eval_argument('score', pipe_item)
 
         if not isinstance(target_score, str):
@@ -92,22 +244,98 @@ class PDF_Template(Input_rule):
         if not target_score.isdecimal():
             raise RuleException(self.name, 'score must be a number')
 
-        score = pdf_similarity(self.base_file_png, second)*100
+        return int(target_score)
+
+    def _render(self, pipe_item: PipeItem, template: 'np.ndarray', dpi: int) -> 'np.ndarray':
+        """First page of the item, at the shape of the template"""
+        from skimage.transform import resize
+
+        try:
+            image = render_first_page(pipe_item.filepath, dpi)
+        except Exception:
+            image = None
+        if image is None:
+            raise RuleException(self.name, f'cannot render "{pipe_item.filepath}"')
+
+        if image.shape != template.shape:
+            image = resize(image, template.shape)
+        return image
+
+    def _result(self, pipe_item: PipeItem, base_file: str, score: float) -> bool:
+        target_score = self._target_score(pipe_item)
+        pipe_item.data['template_score'] = score
 
         if self._eval_argument('verbose', pipe_item) == 'true':
             rprint('[yellow]pdf_template')
             rprint(f'[blue]file:[green] {pipe_item.filepath}')
             rprint(f'[blue]base_file:[green] {base_file}')
-            if score >= int(target_score):
+            if score >= target_score:
                 rprint(f'[blue]score: [green]{score} >= {target_score}')
             else:
                 rprint(f'[blue]score: [red]{score} >= {target_score}')
             rprint('-----')
-        return score >= int(target_score)
-
-        
-
-
-
-
+        return score >= target_score
 
+    def filter_callback(self, pipe_item: PipeItem) -> bool:
+        checked = self._check(pipe_item)
+        if checked is None:
+            return False
+
+        base_file, dpi = checked
+        template = self._template(base_file, dpi)
+        image = self._render(pipe_item, template, dpi)
+
+        score = float(batch_similarity(template, image[None])[0])*100
+        return self._result(pipe_item, base_file, score)
+
+    def batch_filter(self, items: Iterable[PipeItem]) -> Callable[[PipeItem], bool]:
+        """Scores the pages in stacks, one vectorized SSIM per stack of pages that share a template"""
+        import numpy as np
+
+        outcomes: dict[PipeItem, float|bool|Exception] = {}
+        groups: dict[tuple[str, int], list[PipeItem]] = {}
+        for item in sorted(items, key=lambda item: item.filepath):
+            try:
+                checked = self._check(item)
+            except (RuleException, ExpressionException) as e:
+                outcomes[item] = e
+                continue
+            if checked is None:
+                outcomes[item] = False
+            else:
+                groups.setdefault(checked, []).append(item)
+
+        for (base_file, dpi), group in groups.items():
+            try:
+                template = self._template(base_file, dpi)
+            except RuleException as e:
+                outcomes.update((item, e) for item in group)
+                continue
+
+            # pages are rendered a stack at a time, so memory does not grow with the pipe
+            stack_size = max(1, BATCH_BYTES // (template.size * template.itemsize))
+            for start in range(0, len(group), stack_size):
+                images = []
+                rendered = []
+                for item in group[start:start+stack_size]:
+                    try:
+                        images.append(self._render(item, template, dpi))
+                        rendered.append(item)
+                    except RuleException as e:
+                        outcomes[item] = e
+
+                if images:
+                    scores = batch_similarity(template, np.stack(images))*100
+                    outcomes.update(zip(rendered, scores.tolist()))
+
+        def callback(pipe_item: PipeItem) -> bool:
+            outcome = outcomes[pipe_item]
+            if isinstance(outcome, Exception):
+                raise outcome
+            if outcome is False:
+                return False
+
+            base_file = os.path.expanduser(self._eval_argument('base_file', pipe_item)) # type: ignore
+            return self._result(pipe_item, base_file, outcome) # type: ignore
+
+        return callback
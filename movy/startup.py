@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from time import perf_counter
+from typing import NamedTuple
+
+from rich import print as rprint
+from rich.table import Table
+
+# set in the profiled process, which stops once the scripts are parsed
+PROFILE_ENV = 'MOVY_STARTUP_PROFILE'
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # microseconds spent in the module itself and including its own imports
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> list[ImportTime]:
+    """Read the lines written by `python -X importtime`"""
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            times.append(ImportTime(name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            # the header line
+            continue
+    return times
+
+
+def profile(argv: list[str], limit: int = 25):
+    """
+    Run movy again with the same arguments under `-X importtime`, stopping after the scripts
+    are parsed, and show the slowest imports
+    """
+    env = {**os.environ, PROFILE_ENV: '1'}
+    command = [sys.executable, '-X', 'importtime', '-c', 'from movy.__main__ import main; main()', *argv]
+
+    start = perf_counter()
+    p = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = perf_counter() - start
+
+    times = parse_importtime(p.stderr)
+    errors = [line for line in p.stderr.splitlines() if not line.startswith('import time:')]
+    if p.returncode and errors:
+        rprint('[red]' + '\n'.join(errors))
+
+    table = Table(title=f'startup: {elapsed*1000:.0f}ms, imports: {sum(t.self_us for t in times)/1000:.0f}ms')
+    table.add_column('module')
+    table.add_column('self (ms)', justify='right')
+    table.add_column('cumulative (ms)', justify='right')
+
+    for t in sorted(times, key=lambda t: t.cumulative_us, reverse=True)[:limit]:
+        table.add_row(t.module, f'{t.self_us/1000:.1f}', f'{t.cumulative_us/1000:.1f}')
+
+    rprint(table)
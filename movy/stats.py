@@ -0,0 +1,118 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, process_time
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from rich import print as rprint
+
+from . import cache
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+# statistics of the current process, set up by the command line with --stats
+current: Optional['Stats'] = None
+
+
+def cache_hits() -> int:
+    """Hits of the persistent caches so far. Hits inside worker processes are not seen here"""
+    return sum(store.hits for store in (cache.content_store, cache.hash_store) if store)
+
+
+class CommandStats():
+    def __init__(self, block: str, root: str, command: str, kind: str):
+        self.block = block
+        self.root = root
+        # empty for the rows of whole blocks
+        self.command = command
+        # 'block', 'rule' or 'action'
+        self.kind = kind
+
+        self.runs = 0
+        self.items_in = 0
+        self.items_out = 0
+        # items added by the rule itself (add_callback)
+        self.added = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.exceptions = 0
+        self.cache_hits = 0
+
+    @contextmanager
+    def measure(self) -> Iterator['CommandStats']:
+        self.runs += 1
+        wall, cpu, hits = perf_counter(), process_time(), cache_hits()
+        try:
+            yield self
+        finally:
+            self.wall += perf_counter() - wall
+            self.cpu += process_time() - cpu
+            self.cache_hits += cache_hits() - hits
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Stats():
+    """
+    Items in and out, wall and cpu time, exceptions and cache hits of every block and command.
+    Runs of the same command (e.g. in daemon mode) are added together
+    """
+
+    def __init__(self):
+        self.commands: dict[tuple, CommandStats] = {}
+
+    def get(self, key: tuple, block: str, root: str, command: str, kind: str) -> CommandStats:
+        stats = self.commands.get(key)
+        if stats is None:
+            stats = self.commands[key] = CommandStats(block, root, command, kind)
+        return stats
+
+    def block(self, block) -> CommandStats:
+        return self.get((block.root, block.name), block.name, block.root, '', 'block')
+
+    def command(self, block, index: int) -> CommandStats:
+        command = block.commands[index]
+        content = ' '.join(getattr(part, 'content', part) for part in command.content).strip()
+        kind = 'rule' if hasattr(command, 'filter_callback') else 'action'
+        return self.get((block.root, block.name, index), block.name, block.root, f'{command.name}: {content}', kind)
+
+    def clear(self):
+        self.commands.clear()
+
+    def table(self) -> 'Table':
+        from rich.table import Table
+
+        table = Table(title='stats')
+        table.add_column('block')
+        table.add_column('command')
+        for column in ['in', 'out', 'wall (ms)', 'cpu (ms)', 'exceptions', 'cache hits']:
+            table.add_column(column, justify='right')
+
+        for stats in self.commands.values():
+            style = 'bold' if stats.kind == 'block' else None
+            table.add_row(
+                f'{stats.block}\n[grey50]{stats.root}' if stats.kind == 'block' else '',
+                stats.command,
+                str(stats.items_in),
+                str(stats.items_out),
+                f'{stats.wall*1000:.1f}',
+                f'{stats.cpu*1000:.1f}',
+                str(stats.exceptions),
+                str(stats.cache_hits),
+                style=style,
+            )
+        return table
+
+    def report(self, json_path: Optional[str] = None):
+        rprint(self.table())
+
+        if json_path:
+            os.makedirs(os.path.dirname(os.path.abspath(json_path)), exist_ok=True)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'date': datetime.now().isoformat(timespec='seconds'),
+                    'commands': [stats.as_dict() for stats in self.commands.values()],
+                }, f, indent=2)
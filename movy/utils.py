@@ -6,6 +6,9 @@ tmp_folder = '/tmp'
 def extension(text: str) -> str:
     return os.path.basename(os.path.splitext(text)[1]).casefold().strip().replace('.', '')
 
+def normalize_path(path: str) -> str:
+    return os.path.abspath(os.path.expanduser(path))
+
 def parse_int(text) -> int|None:
     if isinstance(text, str) and text.isdecimal():
         return int(text)
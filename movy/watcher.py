@@ -0,0 +1,122 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from time import monotonic
+from typing import Iterable, Optional
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+event_struct = struct.Struct('iIII')
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+class Watcher():
+    """Watches folders for new, moved in or modified files using inotify (linux only)"""
+
+    mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+
+    def __init__(self, folders: Iterable[str]):
+        self.libc = _load_libc()
+        if not self.libc:
+            raise OSError('inotify is not available on this system')
+
+        self.fd: int = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self.watches: dict[int, str] = {}
+        for folder in folders:
+            self.add(folder)
+
+    @staticmethod
+    def is_supported() -> bool:
+        return _load_libc() is not None
+
+    def add(self, folder: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'cannot watch "{folder}": {os.strerror(errno)}')
+        self.watches[wd] = folder
+
+    def _read(self, changes: dict[str, Optional[set[str]]]):
+        buffer = os.read(self.fd, 64 * 1024)
+
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = event_struct.unpack_from(buffer, offset)
+            offset += event_struct.size
+            name = os.fsdecode(buffer[offset:offset+length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, every folder must be scanned again
+                for folder in self.watches.values():
+                    changes[folder] = None
+                continue
+            if mask & (IN_ISDIR | IN_IGNORED) or wd not in self.watches or not name:
+                continue
+
+            folder = self.watches[wd]
+            if folder in changes and changes[folder] is None:
+                continue
+            changes.setdefault(folder, set()).add(os.path.join(folder, name))  # type: ignore
+
+    def wait(self, debounce: float = 1, max_delay: float = 30, timeout: Optional[float] = None) -> dict[str, Optional[set[str]]]:
+        """
+        Block until a file changes, then keep collecting events until the folders
+        are quiet for `debounce` seconds (or `max_delay` seconds have passed).
+
+        Returns the changed paths by folder. None means that the whole folder must be scanned.
+        """
+        changes: dict[str, Optional[set[str]]] = {}
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changes
+
+        start = monotonic()
+        while True:
+            self._read(changes)
+
+            remaining = max_delay - (monotonic() - start)
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self.fd], [], [], min(debounce, remaining))
+            if not ready:
+                break
+
+        return changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
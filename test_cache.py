@@ -0,0 +1,83 @@
+from movy.parsing import Document
+import os
+from movy.cache import ScriptCache, ContentStore
+
+content = r'''
+---
+root: ./script_tests
+---
+[[Cache test]]
+basename: /^al/i
+and extension: txt {
+    strict: true
+}
+echo -> {basename}
+'''
+
+class TestScriptCache():
+    def test_hit_rebuilds_blocks(self, tmp_path):
+        cache = ScriptCache(str(tmp_path))
+
+        first = Document(text=content, cache=cache)
+        second = Document(text=content, cache=cache)
+
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert [repr(c) for c in first.blocks[0].commands] == [repr(c) for c in second.blocks[0].commands]
+        assert second.metadata == {'root': './script_tests'}
+
+    def test_key_depends_on_content(self, tmp_path):
+        cache = ScriptCache(str(tmp_path))
+
+        Document(text=content, cache=cache)
+        Document(text=content.replace('txt', 'md'), cache=cache)
+
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test_changed_file_replaces_its_entry(self, tmp_path):
+        cache = ScriptCache(str(tmp_path / 'cache'), limit=3)
+        script = tmp_path / 'script.movy'
+
+        for extension in ['txt', 'md', 'pdf']:
+            script.write_text(content.replace('txt', extension))
+            Document(str(script), cache=cache)
+        assert len(os.listdir(tmp_path / 'cache')) == 1
+
+        for extension in ['png', 'jpg', 'zip']:
+            Document(text=content.replace('txt', extension), cache=cache)
+        assert len(os.listdir(tmp_path / 'cache')) == 3
+
+
+class TestContentStore():
+    def test_key_survives_rename(self, tmp_path):
+        store = ContentStore(str(tmp_path / 'content.sqlite'))
+        filepath = tmp_path / 'a.txt'
+        filepath.write_text('hello')
+
+        store.put(store.key(str(filepath), os.stat(filepath), 10), 'hello')
+        renamed = tmp_path / 'b.txt'
+        os.rename(filepath, renamed)
+
+        assert store.get(store.key(str(renamed), os.stat(renamed), 10)) == 'hello'
+        assert store.get(store.key(str(renamed), os.stat(renamed), 20)) is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        store = ContentStore(str(tmp_path / 'content.sqlite'), max_size=10)
+
+        store.put('first', 'aaaa')
+        store.put('second', 'bbbb')
+        store.get('first')
+        store.put('third', 'cccc')
+
+        assert store.get('second') is None
+        assert store.get('first') == 'aaaa'
+        assert store.get('third') == 'cccc'
+
+    def test_eviction_removes_digests(self, tmp_path):
+        store = ContentStore(str(tmp_path / 'content.sqlite'), max_size=10)
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            filepath = tmp_path / name
+            filepath.write_text(name)
+            store.put(store.key(str(filepath), os.stat(filepath)), name * 2)
+
+        paths = [row[0] for row in store.connection.execute('SELECT path FROM digests')]
+        assert paths == [str(tmp_path / 'c.txt')]
@@ -0,0 +1,50 @@
+from movy.classes import Expression, PipeItem, FoldedContent, Regex, Argument
+from movy.classes.exceptions import ExpressionException
+from movy.rules.basename import Basename
+
+class TestExpression():
+    def test_eval(self):
+        item = PipeItem('/tmp/folder/report.PDF', ['tag'])
+        item.data['name'] = 'alan'
+
+        assert Expression(" f'{name} {basename} {extension} {flags}'").eval(item) == "alan report pdf ['tag']"
+        assert Expression('[upper(basename) for _ in range(2)]').eval(item) == ['REPORT', 'REPORT']
+
+    def test_syntax_error_on_creation(self):
+        try:
+            Expression('basename(')
+        except ExpressionException as e:
+            assert e.content == 'basename('
+        else:
+            assert False, 'expected an ExpressionException'
+
+    def test_unknown_name(self):
+        try:
+            Expression('unknown').eval(PipeItem('/tmp/a.txt', []))
+        except ExpressionException as e:
+            assert e.message == 'Invalid argument unknown'
+        else:
+            assert False, 'expected an ExpressionException'
+
+class TestFoldedContent():
+    def test_static_content_is_evaluated_once(self):
+        folded = FoldedContent(['/^NF/i'])
+        first = folded.eval(PipeItem('/tmp/a.pdf', []))
+        second = folded.eval(PipeItem('/tmp/b.pdf', []))
+
+        assert folded.is_static
+        assert isinstance(first, Regex) and first is second
+
+    def test_dynamic_content(self):
+        folded = FoldedContent(['/', Expression('basename'), '/'])
+
+        assert not folded.is_static
+        assert folded.eval(PipeItem('/tmp/a.pdf', [])).content == 'a'
+        assert folded.eval(PipeItem('/tmp/b.pdf', [])).content == 'b'
+
+    def test_rule_arguments(self):
+        rule = Basename('basename', [], ['alan'], [Argument('strict', ['true'])], [])
+
+        assert rule.folded_arguments['strict'].is_static
+        assert rule.filter_callback(PipeItem('/tmp/alan.txt', []))
+        assert not rule.filter_callback(PipeItem('/tmp/alana.txt', []))
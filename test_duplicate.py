@@ -0,0 +1,66 @@
+import os
+from movy.parsing import Document
+from movy.cache import DuplicateStore
+from movy.rules import duplicate
+
+content = r'''
+---
+root: {root}
+---
+[[Duplicate test]]
+duplicate:
+'''
+
+def run(root):
+    pipe = Document(text=content.replace('{root}', str(root))).blocks[0].eval()
+    return {os.path.basename(item.filepath): item.data for item in pipe.items}
+
+
+class TestDuplicate():
+    def test_groups(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('movy.cache.duplicate_store', DuplicateStore(str(tmp_path / 'duplicates.sqlite')))
+        root = tmp_path / 'root'
+        root.mkdir()
+
+        big = os.urandom(100_000)
+        (root / 'a.bin').write_bytes(big)
+        (root / 'b.bin').write_bytes(big)
+        # same size, first and last bytes, only the full hash tells them apart
+        (root / 'c.bin').write_bytes(big[:50_000] + b'x' + big[50_001:])
+        (root / 'd.txt').write_text('hello')
+        (root / 'e.txt').write_text('hello')
+        (root / 'empty').write_text('')
+        (root / 'empty2').write_text('')
+        os.utime(root / 'a.bin', (1, 1))
+        os.utime(root / 'd.txt', (1, 1))
+
+        matched = run(root)
+
+        assert sorted(matched) == ['b.bin', 'e.txt']
+        assert matched['b.bin']['original'] == str(root / 'a.bin')
+        assert matched['b.bin']['duplicate_group'] != matched['e.txt']['duplicate_group']
+
+    def test_index_across_roots(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('movy.cache.duplicate_store', DuplicateStore(str(tmp_path / 'duplicates.sqlite')))
+        for name in ['first', 'second']:
+            (tmp_path / name).mkdir()
+            (tmp_path / name / 'file.txt').write_text('same content')
+        os.utime(tmp_path / 'first' / 'file.txt', (1, 1))
+
+        assert run(tmp_path / 'first') == {}
+        assert list(run(tmp_path / 'second')) == ['file.txt']
+
+        # the original is gone, the copy is now unique
+        os.remove(tmp_path / 'first' / 'file.txt')
+        assert run(tmp_path / 'second') == {}
+
+    def test_partial_reads(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('movy.cache.duplicate_store', None)
+        (tmp_path / 'a.bin').write_bytes(b'a' * 100_000)
+        (tmp_path / 'b.bin').write_bytes(b'b' * 100_000)
+
+        full_hashes = []
+        monkeypatch.setattr(duplicate, 'full_hash', lambda path: full_hashes.append(path))
+
+        assert run(tmp_path) == {}
+        assert full_hashes == []
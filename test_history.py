@@ -0,0 +1,50 @@
+import json
+import os
+from movy.classes import History, PipeItem
+from movy.parsing import Document, SyntaxError
+
+content = r'''
+---
+root: {root}
+---
+[[History test]]
+basename: al*n
+echo -> {basename}
+'''
+
+class TestHistory():
+    def test_records_by_command(self):
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'script_tests')
+        document = Document(text=content.replace('{root}', root))
+        block = document.blocks[0]
+        block.eval()
+
+        rule, action = block.commands
+        assert [tuple(record) for record in block.history.items[rule].records] == [(os.path.join(root, 'alan.txt'), 'matched')]
+        assert [record.outcome for record in block.history.items[action].records] == ['done']
+
+    def test_limit_and_spill(self, tmp_path):
+        rule = Document(text=content.replace('{root}', str(tmp_path))).blocks[0].commands[0]
+        history = History(limit=2, spill_file=str(tmp_path / 'history.jsonl'))
+
+        history.append(rule, [PipeItem(f'file{i}', []) for i in range(5)])
+        history.flush()
+
+        assert [record.path for record in history.items[rule].records] == ['file3', 'file4']
+        spilled = [json.loads(line) for line in (tmp_path / 'history.jsonl').read_text().splitlines()]
+        assert [record['path'] for record in spilled] == ['file0', 'file1', 'file2']
+        assert spilled[0]['command'] == 'basename'
+
+    def test_negative_limit(self, tmp_path):
+        text = content.replace('{root}', str(tmp_path)).replace('---\n[[', 'history_limit: -1\n---\n[[')
+        assert Document(text=text).blocks == []
+
+        document = Document(text=content.replace('{root}', str(tmp_path)))
+        parsed = document.parse(document.content)
+        parsed.metadata['history_limit'] = -1
+        try:
+            document.build(parsed)
+        except SyntaxError as e:
+            assert e.message == 'history_limit cannot be negative'
+        else:
+            assert False, 'expected a SyntaxError'
@@ -0,0 +1,34 @@
+import os
+import shutil
+from movy.journal import Journal
+
+
+class TestJournal():
+    def test_undo_last_run(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        (tmp_path / 'dst').mkdir()
+        for name in ['a', 'b']:
+            (tmp_path / name).write_text(name)
+
+        journal.begin_run()
+        for name in ['a', 'b']:
+            journal.record('move', str(tmp_path / name), str(tmp_path / 'dst' / name))
+            shutil.move(tmp_path / name, tmp_path / 'dst' / name)
+        moved_run = journal.run
+        journal.sync()
+
+        assert journal.last_run() == moved_run
+        assert journal.undo(moved_run) == 2
+        assert sorted(os.listdir(tmp_path)) == ['a', 'b', 'dst', 'journal.jsonl']
+
+        runs = journal.runs()
+        assert [(run.operations, run.undoes, run.undone) for run in runs] == [(2, None, True), (2, moved_run, False)]
+        assert journal.last_run() is None
+
+    def test_skips_missing_files(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        journal.begin_run()
+        journal.record('move', str(tmp_path / 'a'), str(tmp_path / 'b'))
+        journal.record('trash', str(tmp_path / 'c'), None)
+
+        assert journal.undo(journal.run) == 0 # type: ignore
@@ -0,0 +1,61 @@
+import os
+from movy.parsing import Document
+from movy.actions.move import Destination
+
+content = r'''
+---
+root: {root}
+---
+[[Move test]]
+extension: txt
+{operator}move -> {dst} {
+    on_conflict: rename
+    makedirs: true
+}
+'''
+
+def run(root, dst, operator=''):
+    text = content.replace('{root}', str(root)).replace('{dst}', '\\' + str(dst) + '/{extension}').replace('{operator}', operator)
+    Document(text=text).blocks[0].eval()
+
+
+class TestMove():
+    def test_groups_by_destination(self, tmp_path):
+        root = tmp_path / 'root'
+        dst = tmp_path / 'dst'
+        root.mkdir()
+        (dst / 'txt').mkdir(parents=True)
+        (dst / 'txt' / 'a.txt').write_text('old')
+        for name in ['a.txt', 'b.txt', 'c.pdf']:
+            (root / name).write_text(name)
+
+        run(root, dst)
+
+        assert sorted(os.listdir(root)) == ['c.pdf']
+        assert sorted(os.listdir(dst / 'txt')) == ['a(1).txt', 'a.txt', 'b.txt']
+        assert (dst / 'txt' / 'a.txt').read_text() == 'old'
+
+    def test_eval_all(self, tmp_path):
+        root = tmp_path / 'root'
+        dst = tmp_path / 'dst'
+        root.mkdir()
+        for name in ['a.txt', 'b.txt']:
+            (root / name).write_text(name)
+
+        run(root, dst, 'all ')
+
+        assert os.listdir(root) == []
+        assert sorted(os.listdir(dst / 'txt')) == ['a.txt', 'b.txt']
+
+    def test_allocate_names(self, tmp_path):
+        for name in ['fatura.pdf', 'fatura(1).pdf', 'fatura(3).pdf']:
+            (tmp_path / name).write_text(name)
+        destination = Destination(str(tmp_path))
+
+        names = []
+        for _ in range(3):
+            names.append(destination.allocate('fatura(', ').pdf'))
+            destination.names.add(names[-1])
+
+        assert names == ['fatura(2).pdf', 'fatura(4).pdf', 'fatura(5).pdf']
+        assert destination.allocate('scan_', '.pdf') == 'scan_1.pdf'
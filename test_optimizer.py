@@ -0,0 +1,86 @@
+import os
+from movy.parsing import Document
+from movy.optimizer import plan, rule_mode
+from movy.classes import Input_rule
+
+def names(script: str) -> list[str]:
+    block = Document(text=script).blocks[0]
+    modes = [rule_mode(c, i == 0) if isinstance(c, Input_rule) else None for i, c in enumerate(block.commands)]
+    return [block.commands[i].name for i in plan(block.commands, modes)]
+
+
+class TestPlan():
+    def test_cheap_rules_first(self):
+        assert names('''
+[[Plan]]
+filecontent: /total/
+and extension: pdf
+and basename: fatura*
+echo -> done
+''') == ['extension', 'basename', 'filecontent', 'echo']
+
+    def test_batch_rules_keep_order(self):
+        assert names('''
+[[Plan]]
+pdf_template: {
+    base_file: a.pdf
+    score: 70
+}
+and filecontent: /total/
+and extension: pdf
+''') == ['pdf_template', 'filecontent', 'extension']
+
+    def test_duplicate_sees_every_file(self, tmp_path):
+        (tmp_path / 'a.bin').write_text('same')
+        (tmp_path / 'b.pdf').write_text('same')
+        os.utime(tmp_path / 'a.bin', (1, 1))
+
+        pipe = Document(text=f'''---
+root: {tmp_path}
+---
+[[Duplicates]]
+duplicate:
+and extension: pdf
+''').blocks[0].eval()
+        assert [os.path.basename(item.filepath) for item in pipe.items] == ['b.pdf']
+
+    def test_flags_keep_order(self):
+        assert names('''
+[[Plan]]
+(invoice) filecontent: /total/
+and extension: pdf
+''') == ['filecontent', 'extension']
+
+    def test_expressions_keep_order(self):
+        assert names('''
+[[Plan]]
+filecontent: /total: (?P<total>\\d+)/
+and if: {int(total) > 10}
+and extension: pdf
+''') == ['filecontent', 'if', 'extension']
+
+    def test_bare_if_keeps_order(self):
+        assert names('''
+[[Plan]]
+filecontent: /total: (?P<total>\\d+)/
+and if: int(total) > 10
+and extension: pdf
+''') == ['extension', 'filecontent', 'if']
+
+    def test_later_or_keeps_order(self):
+        assert names('''
+[[Plan]]
+filecontent: /total/
+and extension: pdf
+or basename: fatura
+''') == ['filecontent', 'extension', 'basename']
+
+    def test_runs_are_split_by_actions(self):
+        assert names('''
+[[Plan]]
+filecontent: /total/
+and extension: pdf
+echo -> first
+and filecontent: /name/
+and basename: fatura
+''') == ['extension', 'filecontent', 'echo', 'basename', 'filecontent']
@@ -0,0 +1,34 @@
+import pickle
+from movy.parsing import Document
+from movy.classes.content import Expression
+from movy.classes.exceptions import RuleException
+
+content = r'''
+---
+root: {root}
+workers: 2
+---
+[[Parallel test]]
+(invoice) filecontent: /total: (?P<total>\d+)/
+'''
+
+class TestParallelFilter():
+    def test_same_result_as_sequential(self, tmp_path):
+        for i in range(6):
+            (tmp_path / f'{i}.txt').write_text(f'total: {i}\n' if i % 2 else 'nothing\n')
+
+        parallel = Document(text=content.replace('{root}', str(tmp_path))).blocks[0].eval()
+        sequential = Document(text=content.replace('{root}', str(tmp_path)).replace('workers: 2', '')).blocks[0].eval()
+
+        summary = lambda pipe: sorted((item.filepath, item.data['total'], item.flags) for item in pipe.items)
+        assert summary(parallel) == summary(sequential)
+        assert [total for _, total, _ in summary(parallel)] == ['1', '3', '5']
+        assert all(item.data['flags'] is item.flags for item in parallel.items)
+
+    def test_exceptions_and_expressions_are_picklable(self):
+        error = pickle.loads(pickle.dumps(RuleException('filecontent', 'cannot fetch file contents')))
+        assert str(error) == '[red]filecontent: cannot fetch file contents'
+
+        expression = pickle.loads(pickle.dumps(Expression('upper(basename)')))
+        assert expression.names == {'upper', 'basename'}
+        assert expression.code
@@ -0,0 +1,50 @@
+from movy.parsing import Document, SyntaxError
+
+content = r'''---
+root: ./script_tests
+---
+
+[[First]]
+extension: pdf
+and basename: /a\{2\}/ {
+    strict: true
+}
+echo -> {basename}
+
+[[Second]]
+extension: txt
+'''
+
+class TestTokenizer():
+    def test_tokens_have_positions(self):
+        document = Document(text=content)
+        tokens = document._tokenizer('extension: pdf {\n  strict: true\n}\necho -> {basename}', line=5)
+
+        result = [(token.type, token.line, token.column) for token in tokens]
+        assert result == [
+            ('rule', 5, 1), ('argument', 5, 16), ('text', 6, 3), ('close', 7, 1),
+            ('action', 8, 1), ('bracket', 8, 9), ('text', 8, 10), ('close', 8, 18),
+        ]
+
+    def test_escaped_brackets_are_text(self):
+        document = Document(text=content)
+        rule = document.blocks[0].commands[1]
+
+        assert rule.content == ['/a{2}/ ']
+
+    def test_commands_keep_source_line(self):
+        document = Document(text=content)
+        parsed = document.parse(content)
+
+        assert [command.line for command in parsed.blocks[0].commands] == [6, 7, 10]
+        assert [command.line for command in parsed.blocks[1].commands] == [13]
+
+    def test_error_reports_source_line(self):
+        document = Document(text=content)
+
+        try:
+            document.parse(content.replace('{basename}', '{basename'))
+        except SyntaxError as e:
+            assert (e.lineno, e.column) == (10, 9)
+        else:
+            assert False, 'expected a SyntaxError'
@@ -0,0 +1,89 @@
+import os
+import pytest
+from movy.cache import HashStore
+from movy.parsing import Document
+from movy.rules.pdf_template import render_first_page, similarity, dhash, page_hash, batch_similarity
+
+fitz = pytest.importorskip('fitz')
+pytest.importorskip('skimage')
+
+
+def make_pdf(path, text):
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 72), text, fontsize=30)
+    document.save(str(path))
+    document.close()
+
+
+script = r'''
+---
+root: {root}
+---
+[[Template test]]
+pdf_template: {
+    base_file: {root}/a.pdf
+    score: 99
+    hash_distance: 64
+}
+'''
+
+class TestPdfTemplate():
+    def test_render_in_memory(self, tmp_path):
+        make_pdf(tmp_path / 'a.pdf', 'Invoice')
+
+        image = render_first_page(str(tmp_path / 'a.pdf'), dpi=36)
+
+        # A4 at 36 dpi, grayscale
+        assert image.shape == (421, 298)
+        assert 0 <= image.min() < image.max() == 1
+        assert list(tmp_path.iterdir()) == [tmp_path / 'a.pdf']
+
+    def test_similarity(self, tmp_path):
+        make_pdf(tmp_path / 'a.pdf', 'Invoice')
+        make_pdf(tmp_path / 'b.pdf', 'Invoice')
+        template = render_first_page(str(tmp_path / 'a.pdf'))
+
+        assert similarity(template, render_first_page(str(tmp_path / 'b.pdf'))) == pytest.approx(1)
+        assert similarity(template, render_first_page(str(tmp_path / 'b.pdf'), dpi=72)) > 0.9
+
+    def test_hash_distance(self, tmp_path):
+        make_pdf(tmp_path / 'a.pdf', 'Invoice')
+        make_pdf(tmp_path / 'b.pdf', 'Invoice')
+        make_pdf(tmp_path / 'c.pdf', 'A completely different page, with long lines of text')
+
+        a, b, c = (dhash(render_first_page(str(tmp_path / name), 12)) for name in ['a.pdf', 'b.pdf', 'c.pdf'])
+
+        assert (a ^ b).bit_count() == 0
+        assert (a ^ c).bit_count() > 0
+
+    def test_hash_store(self, tmp_path, monkeypatch):
+        store = HashStore(str(tmp_path / 'hashes.sqlite'))
+        monkeypatch.setattr('movy.cache.hash_store', store)
+        make_pdf(tmp_path / 'a.pdf', 'Invoice')
+        stat = os.stat(tmp_path / 'a.pdf')
+
+        assert page_hash(str(tmp_path / 'a.pdf'), stat) == page_hash(str(tmp_path / 'a.pdf'), stat)
+        assert (store.hits, store.misses) == (1, 1)
+
+    def test_batch_matches_skimage(self):
+        from skimage.metrics import structural_similarity
+        np = pytest.importorskip('numpy')
+        random = np.random.default_rng(0)
+        template = random.random((40, 30))
+        images = np.stack([random.random((40, 30)), template * 0.8 + 0.1])
+
+        scores = batch_similarity(template, images)
+
+        assert scores == pytest.approx([structural_similarity(template, image, data_range=1.0) for image in images])
+
+    def test_score_in_data(self, tmp_path):
+        make_pdf(tmp_path / 'a.pdf', 'Invoice')
+        make_pdf(tmp_path / 'b.pdf', 'Invoice')
+        make_pdf(tmp_path / 'c.pdf', 'A completely different page, with long lines of text')
+        (tmp_path / 'd.pdf').write_text('not a pdf')
+
+        pipe = Document(text=script.replace('{root}', str(tmp_path))).blocks[0].eval()
+
+        assert sorted(os.path.basename(item.filepath) for item in pipe.items) == ['a.pdf', 'b.pdf']
+        assert all(item.data['template_score'] == pytest.approx(100) for item in pipe.items)
@@ -0,0 +1,73 @@
+import os
+from copy import deepcopy
+from movy.classes import Pipe, PipeItem, Property
+
+class TestPipeItem():
+    def test_reads_types_from_entry(self, tmp_path):
+        open(tmp_path / 'a.txt', 'w').close()
+        os.symlink(tmp_path / 'a.txt', tmp_path / 'link.txt')
+
+        with os.scandir(tmp_path) as entries:
+            items = {entry.name: PipeItem(entry.path, [], entry) for entry in entries}
+
+        assert items['a.txt'].isfile and not items['a.txt'].islink
+        assert items['link.txt'].isfile and items['link.txt'].islink
+        assert items['a.txt'].stat().st_size == 0
+
+        # the cached values survive the file being removed
+        os.remove(tmp_path / 'a.txt')
+        assert items['a.txt'].isfile
+        assert Property(items['a.txt'].filepath, item=items['a.txt'])['isfile']
+
+    def test_deepcopy_keeps_cache(self, tmp_path):
+        open(tmp_path / 'a.txt', 'w').close()
+        with os.scandir(tmp_path) as entries:
+            entry = next(entries)
+            item = PipeItem(entry.path, [], entry)
+        assert item.isfile
+
+        copied = deepcopy(item)
+        assert copied.entry is None and copied.isfile
+
+    def test_data_is_created_on_use(self):
+        item = PipeItem('/tmp/a.txt', [])
+        assert item.extra_data() == {} and item.variables()['path'] == '/tmp/a.txt'
+
+        item.data['total'] = 1
+        assert item.data['flags'] is item.flags
+        assert item.extra_data() == {'total': 1} and item.variables()['total'] == 1
+
+
+class TestPipe():
+    def make_pipe(self):
+        items = [PipeItem(f'/tmp/{name}', []) for name in ['a.txt', 'b.pdf', 'c.txt', 'd.md']]
+        return Pipe(items + items[:1], '/tmp'), items
+
+    def names(self, items):
+        return sorted(item.filepath[5:] for item in items)
+
+    def test_modes(self):
+        pipe, items = self.make_pipe()
+        assert len(pipe.items) == 4
+
+        pipe.filter(lambda item: item.filepath.endswith('.txt'))
+        assert self.names(pipe.items) == ['a.txt', 'c.txt']
+
+        pipe.mode = 'or'
+        pipe.filter(lambda item: item.filepath.endswith('.md'))
+        assert self.names(pipe.items) == ['a.txt', 'c.txt', 'd.md']
+
+        pipe.mode = 'reset'
+        pipe.filter(lambda item: item.filepath.endswith('.pdf'))
+        assert self.names(pipe.items) == ['b.pdf']
+        assert items[1] in pipe.items and items[0] not in pipe.items
+        assert len(pipe.original_items) == 4
+
+    def test_add(self):
+        pipe, items = self.make_pipe()
+        pipe.filter(lambda item: False)
+        added = PipeItem('/tmp/e.txt', [])
+
+        pipe.add(lambda root: [added, items[0]])
+        assert self.names(pipe.items) == ['a.txt', 'e.txt']
+        assert added not in pipe.original_items
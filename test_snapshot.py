@@ -0,0 +1,36 @@
+import os
+from movy.classes import SnapshotStore
+
+class TestSnapshot():
+    def test_items_share_file_cache(self, tmp_path):
+        for name in ['a.txt', 'b.txt']:
+            open(tmp_path / name, 'w').close()
+        os.mkdir(tmp_path / 'folder')
+
+        snapshots = SnapshotStore()
+        first = snapshots.get(str(tmp_path)).items(str(tmp_path))
+        first[0].cache['key'] = 'value'
+        first[0].data['group'] = 'block data'
+
+        second = snapshots.get(str(tmp_path) + '/').items(str(tmp_path))
+
+        assert sorted(os.path.basename(item.filepath) for item in second) == ['a.txt', 'b.txt']
+        assert second[0] is not first[0] and second[0].cache == {'key': 'value'}
+        assert 'group' not in second[0].data
+
+    def test_moved_files_are_invalidated(self, tmp_path):
+        source, destination = tmp_path / 'source', tmp_path / 'destination'
+        os.mkdir(source)
+        os.mkdir(destination)
+        open(source / 'a.txt', 'w').close()
+
+        snapshots = SnapshotStore()
+        snapshots.get(str(source)).items(str(source))
+        assert snapshots.get(str(destination)).items(str(destination)) == []
+
+        os.rename(source / 'a.txt', destination / 'a.txt')
+        snapshots.discard(str(source / 'a.txt'))
+        snapshots.add(str(destination / 'a.txt'))
+
+        assert snapshots.get(str(source)).items(str(source)) == []
+        assert [item.filepath for item in snapshots.get(str(destination)).items(str(destination))] == [str(destination / 'a.txt')]
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+import movy
+from movy.startup import parse_importtime
+
+
+class TestStartup():
+    def test_registry_is_lazy(self):
+        code = (
+            'import sys; from movy.parsing import Document; from movy.rules import RULES;'
+            'assert "movy.rules.filecontent" not in sys.modules;'
+            'assert "filecontent" in RULES and "movy.rules.filecontent" not in sys.modules;'
+            'assert RULES["filecontent"].__name__ == "FileContent" and "movy.rules.filecontent" in sys.modules'
+        )
+        # other tests change the working directory
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(movy.__file__)))
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   yaml.error\n'
+            'import time:       500 |        620 | yaml\n'
+            'not an import line\n'
+        )
+        times = parse_importtime(output)
+
+        assert [(t.module, t.self_us, t.cumulative_us) for t in times] == [('yaml.error', 120, 120), ('yaml', 500, 620)]
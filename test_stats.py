@@ -0,0 +1,38 @@
+import json
+from movy.parsing import Document
+from movy.stats import Stats
+from movy import stats
+
+content = r'''
+---
+root: {root}
+simulate: true
+---
+[[Stats test]]
+extension: txt
+and filecontent: /hello/
+echo -> {path}
+'''
+
+
+class TestStats():
+    def test_counts(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(stats, 'current', Stats())
+        (tmp_path / 'a.txt').write_text('hello')
+        (tmp_path / 'b.txt').write_text('bye')
+        (tmp_path / 'c.pdf').write_text('')
+
+        Document(text=content.replace('{root}', str(tmp_path))).blocks[0].eval()
+
+        rows = {row.command.split(':')[0]: row for row in stats.current.commands.values()} # type: ignore
+        assert (rows['extension'].items_in, rows['extension'].items_out) == (3, 2)
+        assert (rows['filecontent'].items_in, rows['filecontent'].items_out) == (2, 1)
+        assert (rows['echo'].items_in, rows['echo'].items_out) == (1, 1)
+        assert rows[''].kind == 'block'
+        assert all(row.root == str(tmp_path) for row in rows.values())
+        assert all(row.runs == 1 for row in rows.values())
+
+        stats.current.report(str(tmp_path / 'stats.json')) # type: ignore
+        saved = json.loads((tmp_path / 'stats.json').read_text())
+        assert [row['kind'] for row in saved['commands']] == ['block', 'rule', 'rule', 'action']
+        assert saved['commands'][0]['command'] == '' and saved['commands'][0]['root'] == str(tmp_path)
@@ -0,0 +1,65 @@
+import os
+from movy.parsing import Document
+from movy.classes import SnapshotStore
+
+content = r'''
+---
+root: {root}
+stream: {stream}
+---
+[[Stream test]]
+extension: txt
+and basename: /^keep/
+move -> \{dst} {
+    silent: true
+}
+'''
+
+def run(root, dst, stream):
+    text = content.replace('{root}', str(root)).replace('{dst}', str(dst)).replace('{stream}', stream)
+    return Document(text=text).blocks[0]
+
+
+class TestStream():
+    def test_same_result(self, tmp_path):
+        root = tmp_path / 'root'
+        root.mkdir()
+        names = [f'keep_{i}.txt' for i in range(7)] + [f'drop_{i}.txt' for i in range(5)] + ['keep.pdf']
+        for name in names:
+            (root / name).write_text(name)
+
+        block = run(root, tmp_path / 'dst', '3')
+        assert block.stream_chunk() == 3
+        (tmp_path / 'dst').mkdir()
+        pipe = block.eval()
+
+        assert sorted(os.path.basename(item.filepath) for item in pipe.items) == [f'keep_{i}.txt' for i in range(7)]
+        assert sorted(os.listdir(tmp_path / 'dst')) == [f'keep_{i}.txt' for i in range(7)]
+        assert sorted(os.listdir(root)) == sorted([f'drop_{i}.txt' for i in range(5)] + ['keep.pdf'])
+
+    def test_chunks(self, tmp_path):
+        for i in range(5):
+            (tmp_path / f'{i}.txt').write_text('')
+
+        chunks = list(SnapshotStore().get(str(tmp_path)).chunks(str(tmp_path), 2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    def test_only_and_blocks(self, tmp_path):
+        block = run(tmp_path, tmp_path / 'dst', 'true')
+        assert block.stream_chunk() == 1000
+
+        block.commands[1].operator = ['or']
+        assert not block.can_stream()
+        assert block.stream_chunk() == 0
+
+    def test_caches_are_dropped(self, tmp_path):
+        for i in range(5):
+            (tmp_path / f'{i}.txt').write_text(f'total {i}')
+
+        snapshots = SnapshotStore()
+        text = f'---\nroot: {tmp_path}\nstream: 2\n---\n[[Stream cache]]\nextension: txt\nand filecontent: /total [0-2]/\n'
+        pipe = Document(text=text).blocks[0].eval(snapshots=snapshots)
+
+        assert len(pipe.items) == 3
+        assert all(not record.cache for record in snapshots.get(str(tmp_path)).records.values())
@@ -0,0 +1,45 @@
+import os
+from movy.parsing import Document
+from movy.classes import SnapshotStore
+
+content = r'''
+---
+root: {root}
+---
+[[Terminal test]]
+extension: txt
+{operator}terminal -> {command} {
+    max_parallel: 2
+    batch_size: 2
+}
+'''
+
+def run(root, command, operator=''):
+    text = content.replace('{root}', str(root)).replace('{command}', command).replace('{operator}', operator)
+    pipe = Document(text=text).blocks[0].eval()
+    return {os.path.basename(item.filepath): str(item.data['terminal']) for item in pipe.items}
+
+
+class TestTerminal():
+    def test_each_item(self, tmp_path):
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            (tmp_path / name).write_text(name)
+
+        assert run(tmp_path, 'cat {path}') == {'a.txt': 'a.txt', 'b.txt': 'b.txt', 'c.txt': 'c.txt'}
+
+    def test_batches(self, tmp_path):
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            (tmp_path / name).write_text(name)
+
+        outputs = run(tmp_path, 'cat', 'all ')
+
+        assert outputs == {'a.txt': 'a.txtb.txt', 'b.txt': 'a.txtb.txt', 'c.txt': 'c.txt'}
+
+    def test_read_only_commands_keep_the_snapshot(self, tmp_path):
+        (tmp_path / 'a.txt').write_text('a')
+
+        for read_only, stale in [('false', True), ('true', False)]:
+            snapshots = SnapshotStore()
+            text = content.replace('{root}', str(tmp_path)).replace('{command}', 'cat {path}').replace('{operator}', '')
+            Document(text=text.replace('batch_size: 2', f'read_only: {read_only}')).blocks[0].eval(snapshots=snapshots)
+            assert snapshots.get(str(tmp_path)).stale == stale
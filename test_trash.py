@@ -0,0 +1,62 @@
+import os
+from movy.parsing import Document
+from movy.journal import Journal
+from movy import journal
+
+content = r'''
+---
+root: {root}
+---
+[[Trash test]]
+extension: txt
+all trash -> {
+    confirm: false
+}
+'''
+
+
+class TestTrash():
+    def test_trash_and_undo(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+        monkeypatch.setattr(journal, 'current', Journal(str(tmp_path / 'journal.jsonl')))
+        root = tmp_path / 'root'
+        trash = tmp_path / 'data' / 'Trash'
+        (trash / 'files').mkdir(parents=True)
+        (trash / 'files' / 'a.txt').write_text('trashed before')
+        root.mkdir()
+        for name in ['a.txt', 'b.txt', 'c.pdf']:
+            (root / name).write_text(name)
+
+        Document(text=content.replace('{root}', str(root))).blocks[0].eval()
+
+        assert sorted(os.listdir(root)) == ['c.pdf']
+        assert sorted(os.listdir(trash / 'files')) == ['a.1.txt', 'a.txt', 'b.txt']
+        assert sorted(os.listdir(trash / 'info')) == ['a.1.txt.trashinfo', 'b.txt.trashinfo']
+
+        info = (trash / 'info' / 'a.1.txt.trashinfo').read_text().splitlines()
+        assert info[:2] == ['[Trash Info]', f'Path={root / "a.txt"}']
+        assert info[2].startswith('DeletionDate=')
+
+        assert journal.current.undo(journal.current.run) == 2 # type: ignore
+        assert sorted(os.listdir(root)) == ['a.txt', 'b.txt', 'c.pdf']
+        assert (root / 'a.txt').read_text() == 'a.txt'
+        assert os.listdir(trash / 'info') == []
+
+    def test_trash_is_opened_once(self, tmp_path, monkeypatch):
+        from movy.actions.trash import TrashCan
+        monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+        monkeypatch.setattr(journal, 'current', None)
+        root = tmp_path / 'root'
+        root.mkdir()
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            (root / name).write_text(name)
+
+        opened = []
+        for_device = TrashCan.for_device.__func__
+        monkeypatch.setattr(TrashCan, 'for_device', classmethod(lambda cls, filepath: opened.append(filepath) or for_device(cls, filepath)))
+
+        script = content.replace('{root}', str(root)).replace('all trash', 'trash')
+        Document(text=script).blocks[0].eval()
+
+        assert os.listdir(root) == []
+        assert len(opened) == 1
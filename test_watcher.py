@@ -0,0 +1,23 @@
+import os
+import pytest
+from movy.watcher import Watcher
+
+@pytest.mark.skipif(not Watcher.is_supported(), reason='inotify is not available')
+class TestWatcher():
+    def test_collects_changed_files(self, tmp_path):
+        folder = str(tmp_path)
+        os.mkdir(os.path.join(folder, 'subfolder'))
+
+        with Watcher([folder]) as watcher:
+            for name in ['a.txt', 'b.pdf']:
+                with open(os.path.join(folder, name), 'w') as f:
+                    f.write('content')
+            os.mkdir(os.path.join(folder, 'ignored'))
+
+            changes = watcher.wait(debounce=0.1, timeout=5)
+
+        assert changes == {folder: {os.path.join(folder, 'a.txt'), os.path.join(folder, 'b.pdf')}}
+
+    def test_timeout_without_events(self, tmp_path):
+        with Watcher([str(tmp_path)]) as watcher:
+            assert watcher.wait(debounce=0.1, timeout=0.1) == {}